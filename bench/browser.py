@@ -0,0 +1,139 @@
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# Heavy assets are served slowly, like a CDN far away; a lean profile should never wait for them
+SLOW_PREFIXES = ("/img/", "/fonts/", "/media/", "/pagead/")
+SLOW_ASSET_S = 0.3
+
+STAT_TILES = [
+    ("Aces", "7", "3"),
+    ("Double Faults", "2", "5"),
+    ("1st Serve", "40/62 (65%)", "35/60 (58%)"),
+    ("1st Serve Points Won", "30/40 (75%)", "22/35 (63%)"),
+    ("Service Points Won", "45/62 (73%)", "36/60 (60%)"),
+    ("Return Points Won", "24/60 (40%)", "17/62 (27%)"),
+]
+
+
+def stats_page(n):
+    tiles = "\n".join(
+        f'<div class="statTileWrapper"><div class="labelWrappper"><div>{label}</div></div>'
+        f'<div class="p1Stats">{p1}</div><div class="p2Stats">{p2}</div></div>'
+        for label, p1, p2 in STAT_TILES
+    )
+    images = "\n".join(f'<img src="/img/player{n}-{i}.png" width="200">' for i in range(8))
+    return f"""<!doctype html>
+<html><head>
+<style>@font-face {{ font-family: Brand; src: url(/fonts/brand.woff2); }} body {{ font-family: Brand; }}</style>
+<script async src="/pagead/ads.js"></script>
+</head><body>
+{images}
+<video src="/media/highlights{n}.mp4" preload="auto"></video>
+{tiles}
+</body></html>"""
+
+
+def results_page(pages):
+    matches = "\n".join(
+        f'<div class="match"><div class="match-header"><span><strong>Round of 32</strong></span></div>'
+        f'<div class="stats-item"><div class="name"><a>Player {2 * n}</a></div><div class="winner"></div></div>'
+        f'<div class="stats-item"><div class="name"><a>Player {2 * n + 1}</a></div></div>'
+        f'<div class="match-cta"><a href="/scores/stats/{n}.html">Stats</a></div></div>'
+        for n in range(pages)
+    )
+    return f"""<!doctype html>
+<html><body>
+<div class="tournament-day"><h4>Sun, 12 January, 2025</h4></div>
+<img src="/img/banner.png">
+{matches}
+</body></html>"""
+
+
+def write_fixtures(root, pages):
+    os.makedirs(os.path.join(root, "scores", "stats"))
+    for n in range(pages):
+        with open(os.path.join(root, "scores", "stats", f"{n}.html"), "w") as f:
+            f.write(stats_page(n))
+    with open(os.path.join(root, "scores", "results.html"), "w") as f:
+        f.write(results_page(pages))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith(SLOW_PREFIXES):
+            time.sleep(SLOW_ASSET_S)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root):
+    handler = lambda *args, **kwargs: FixtureHandler(*args, directory=root, **kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_profile(profile, base_url, pages, recycle_after):
+    from parsing import parse_stats_html
+    from scrape_atp import Browser, harvest_results_page, page_timings, scrape_stats_page
+
+    expected = parse_stats_html(stats_page(0))
+    page_timings.clear()
+    browser = Browser(delay=(0, 0), profile=profile)
+    if recycle_after is not None:
+        browser.profile = {**browser.profile, "recycle_after": recycle_after}
+    try:
+        start = time.perf_counter()
+        descriptors = harvest_results_page(browser, f"{base_url}/scores/results.html")
+        assert len(descriptors) == pages, f"{profile}: parsed {len(descriptors)} of {pages} matches"
+        for descriptor in descriptors:
+            stats = scrape_stats_page(browser, descriptor["stats_url"])
+            assert stats == expected, f"{profile}: unexpected stats from {descriptor['stats_url']}: {stats}"
+        elapsed = time.perf_counter() - start
+    finally:
+        browser.quit()
+
+    loads = [t["load_s"] * 1000 for t in page_timings]
+    extracts = [t["extract_s"] * 1000 for t in page_timings]
+    return {
+        "pages": len(loads),
+        "median_load_ms": statistics.median(loads),
+        "median_extract_ms": statistics.median(extracts),
+        "pages_per_min": 60 * (len(loads) + 1) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare browser profiles on locally served ATP-like pages")
+    parser.add_argument("--profiles", nargs="+", default=["default", "lean"])
+    parser.add_argument("--pages", type=int, default=20, help="stats pages per profile")
+    parser.add_argument("--recycle-after", type=int, help="override the profiles' driver recycling interval")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixtures(root, args.pages)
+        server, base_url = serve(root)
+        try:
+            results = {profile: run_profile(profile, base_url, args.pages, args.recycle_after)
+                       for profile in args.profiles}
+        finally:
+            server.shutdown()
+
+    for profile, r in results.items():
+        print(f"{profile:10s} {r['pages']:4d} pages  load {r['median_load_ms']:8.1f} ms  "
+              f"extract {r['median_extract_ms']:6.1f} ms  {r['pages_per_min']:7.1f} pages/min")
+
+
+if __name__ == "__main__":
+    main()
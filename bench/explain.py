@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sys
+
+# Tables that grow with every scraped match; a full scan of these is a missing index
+LARGE_TABLES = {"match", "stats"}
+
+
+def capture_statements(func, args):
+    from sqlalchemy import event
+    from db import get_engine
+
+    engine = get_engine()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        func(*args)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def _postgres_seq_scans(plan):
+    scans = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        scans.extend(_postgres_seq_scans(child))
+    return scans
+
+
+def seq_scans(conn, statement, parameters):
+    if conn.dialect.name == "postgresql":
+        raw = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        return _postgres_seq_scans(plan[0]["Plan"])
+
+    # SQLite: "SCAN stats" without an index, as opposed to "SEARCH stats USING INDEX ..."
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    scans = []
+    for row in rows:
+        detail = row[-1].split()
+        if len(detail) >= 2 and detail[0] == "SCAN" and detail[1] in LARGE_TABLES and "INDEX" not in detail:
+            scans.append(detail[1])
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a utils.py query sequentially scans match or stats")
+    parser.add_argument("--url", help="database URL, e.g. sqlite:///bench.db (defaults to DATABASE_URL/.env)")
+    args = parser.parse_args()
+
+    # db reads DATABASE_URL at import time
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+    import db
+    from bench.run import clear_caches, collect_cases
+    db.get_engine().echo = False
+
+    # Planner statistics are stale right after a synthetic bulk load
+    with db.get_engine().begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    failures = []
+    for name, func, func_args in collect_cases():
+        if not name.startswith("utils."):
+            continue
+        clear_caches()
+        for statement, parameters in capture_statements(func, func_args):
+            with db.get_engine().connect() as conn:
+                scans = seq_scans(conn, statement, parameters)
+            status = f"SEQ SCAN on {', '.join(scans)}" if scans else "ok"
+            print(f"{name:45s} {status}")
+            if scans:
+                failures.append(name)
+
+    if failures:
+        print(f"\n{len(failures)} queries scan large tables: {sorted(set(failures))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
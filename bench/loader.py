@@ -0,0 +1,74 @@
+import argparse
+import os
+import statistics
+import time
+import tracemalloc
+import pandas as pd
+from sqlmodel import Session, select
+from bench.run import pick_arguments
+from db import Player, Stats, get_engine
+from utils import STATS_COLUMNS, load_frame
+
+
+def orm_frame(player_id):
+    # The previous utils path: ORM objects -> one dict per row -> DataFrame
+    with Session(get_engine()) as session:
+        rows = []
+        for s, player_name in session.exec(
+            select(Stats, Player.name).join(Player, Player.id == Stats.player_id).where(Stats.player_id == player_id)
+        ):
+            row = s.model_dump()
+            row["player"] = player_name
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def columnar_frame(player_id, stream=False):
+    return load_frame(
+        select(*STATS_COLUMNS, Player.name.label("player"))
+        .join(Player, Player.id == Stats.player_id)
+        .where(Stats.player_id == player_id),
+        stream=stream,
+    )
+
+
+def measure(func, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Separate run: tracing slows allocation-heavy code far more than the rest
+    tracemalloc.start()
+    df = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": statistics.median(timings), "peak_kb": peak / 1024, "rows": len(df)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ORM .dict() loader with utils.load_frame on a full player history")
+    parser.add_argument("--url", help="database URL, e.g. sqlite:///bench.db (defaults to DATABASE_URL/.env)")
+    parser.add_argument("--player", type=int, help="player id (defaults to the player with the most stats rows)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    player_id = args.player or pick_arguments()[1]
+    cases = [
+        ("orm .dict()", orm_frame, (player_id,)),
+        ("load_frame", columnar_frame, (player_id,)),
+        ("load_frame stream", columnar_frame, (player_id, True)),
+    ]
+    results = {name: measure(func, func_args, args.repeat) for name, func, func_args in cases}
+    base = results["orm .dict()"]
+    for name, r in results.items():
+        print(f"{name:20s} {r['rows']:7d} rows {r['median_ms']:9.2f} ms ({base['median_ms'] / r['median_ms']:5.1f}x) "
+              f"peak {r['peak_kb']:9.0f} KB ({base['peak_kb'] / r['peak_kb']:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
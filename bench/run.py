@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from sqlalchemy import func
+from sqlmodel import Session, select
+import utils
+from db import Match, Stats, count_statements, get_engine
+
+
+def pick_arguments():
+    with Session(get_engine()) as session:
+        # Busiest tournament and most frequent player, so the benchmarks hit the large cases
+        tournament_id = session.exec(
+            select(Match.tournament_id).group_by(Match.tournament_id)
+            .order_by(func.count().desc()).limit(1)
+        ).first()
+        player_id = session.exec(
+            select(Stats.player_id).group_by(Stats.player_id)
+            .order_by(func.count().desc()).limit(1)
+        ).first()
+        match_id = session.exec(
+            select(Match.id).where(
+                (Match.tournament_id == tournament_id) &
+                ((Match.player1_id == player_id) | (Match.player2_id == player_id))
+            ).limit(1)
+        ).first()
+        if match_id is None:
+            match_id = session.exec(select(Match.id).where(Match.tournament_id == tournament_id)).first()
+    return tournament_id, player_id, match_id
+
+
+def collect_cases():
+    # Importing deploy builds the Dash app and switches this process to the dashboard engine profile
+    import deploy
+
+    tournament_id, player_id, match_id = pick_arguments()
+    stat_x, stat_y = "% побед на подаче", "% побед на приеме"
+
+    return [
+        ("utils.list_tournaments", utils.list_tournaments, ()),
+        ("utils.list_players", utils.list_players, ()),
+        ("utils.search_players", utils.search_players, ("Player 0",)),
+        ("utils.search_tournaments", utils.search_tournaments, ("Open",)),
+        ("utils.list_matches_for_tournament", utils.list_matches_for_tournament, (tournament_id,)),
+        ("utils.get_match_stats", utils.get_match_stats, (match_id,)),
+        ("utils.get_player_stats_across_matches", utils.get_player_stats_across_matches,
+         (player_id, tournament_id)),
+        ("utils.get_players_in_tournament", utils.get_players_in_tournament, (tournament_id,)),
+        ("utils.get_player_stat_values", utils.get_player_stat_values, (player_id, "aces")),
+        ("utils.get_player_stat_matrix", utils.get_player_stat_matrix,
+         (player_id, ["service_points_won", "return_points_won"])),
+        ("utils.get_player_stat_summary", utils.get_player_stat_summary, (player_id, "aces")),
+        ("utils.get_player_form", utils.get_player_form, (player_id, "aces")),
+        ("utils.get_player_name", utils.get_player_name, (player_id,)),
+        ("utils.get_tournament_name", utils.get_tournament_name, (tournament_id,)),
+        ("deploy.search_tournament_options", deploy.search_tournament_options, ("Open", tournament_id)),
+        ("deploy.search_player_options", deploy.search_player_options, ("Player 0", player_id)),
+        ("deploy.set_player_options", deploy.set_player_options, (tournament_id,)),
+        ("deploy.plot_spider_for_match", deploy.plot_spider_for_match, (match_id,)),
+        ("deploy.set_match_options", deploy.set_match_options, (tournament_id,)),
+        ("deploy.plot_stat_lines", deploy.plot_stat_lines, (player_id, tournament_id)),
+        ("deploy.plot_stat_comparison", deploy.plot_stat_comparison, (player_id, stat_x, stat_y)),
+        ("deploy.plot_form", deploy.plot_form, (player_id, stat_x)),
+        ("deploy.show_similar_players", deploy.show_similar_players, (player_id, "cosine")),
+    ]
+
+
+def clear_caches():
+    for value in vars(utils).values():
+        if callable(getattr(value, "cache_clear", None)):
+            value.cache_clear()
+
+
+def run_case(func, args, repeat, cached):
+    timings = []
+    statements = 0
+    for _ in range(repeat):
+        if not cached:
+            clear_caches()
+        with count_statements() as counter:
+            start = time.perf_counter()
+            func(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        statements = counter["count"]
+    return {
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "statements": statements,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:45s} {result['median_ms']:10.2f} ms  (new)")
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{name:45s} {result['median_ms']:10.2f} ms  {ratio:6.2f}x baseline  {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time utils.py queries and deploy.py callbacks")
+    parser.add_argument("--url", help="database URL, e.g. sqlite:///bench.db (defaults to DATABASE_URL/.env)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--cached", action="store_true", help="keep query caches warm between runs")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous --out file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="median slowdown vs baseline counted as a regression")
+    args = parser.parse_args()
+
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    results = {}
+    for name, func, func_args in collect_cases():
+        if args.filter not in name:
+            continue
+        results[name] = run_case(func, func_args, args.repeat, args.cached)
+        r = results[name]
+        print(f"{name:45s} {r['median_ms']:10.2f} ms  {r['statements']:3d} statements")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "dialect": get_engine().dialect.name,
+            "repeat": args.repeat,
+            "cached": args.cached,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import random
+import time
+from sqlalchemy import insert
+from db import Player, create_db, get_engine, insert_match_bundle
+
+# Mirrors the value ranges the ATP stats pages produce
+PERCENT_STATS = [
+    "first_serve", "1st_serve_points_won", "2nd_serve_points_won", "break_points_saved",
+    "1st_serve_return_points_won", "2nd_serve_return_points_won", "break_points_converted",
+    "net_points_won", "service_points_won", "return_points_won", "total_points_won",
+]
+COUNT_STATS = {
+    "serve_rating": (150, 350),
+    "aces": (0, 30),
+    "double_faults": (0, 12),
+    "service_games_played": (6, 30),
+    "return_rating": (50, 250),
+    "return_games_played": (6, 30),
+    "winners": (5, 70),
+    "unforced_errors": (5, 60),
+}
+
+
+def random_stats(rng):
+    stats = {key: round(rng.uniform(0.2, 0.9), 2) for key in PERCENT_STATS}
+    for key, (low, high) in COUNT_STATS.items():
+        stats[key] = rng.randint(low, high)
+    return stats
+
+
+def generate(seasons=5, tournaments_per_season=20, matches_per_tournament=64, players=500,
+             last_year=2025, seed=0):
+    rng = random.Random(seed)
+    create_db()
+
+    start = time.perf_counter()
+    with get_engine("scraper").begin() as conn:
+        result = conn.execute(
+            insert(Player.__table__).returning(Player.__table__.c.id, sort_by_parameter_order=True),
+            [{"name": f"Synthetic Player {i:05d}"} for i in range(players)],
+        )
+        player_ids = [row.id for row in result]
+
+    stats_rows = 0
+    for season in range(seasons):
+        year = last_year - seasons + 1 + season
+        for t in range(tournaments_per_season):
+            matches = []
+            for _ in range(matches_per_tournament):
+                p1_id, p2_id = rng.sample(player_ids, 2)
+                matches.append({
+                    "player1_id": p1_id,
+                    "player2_id": p2_id,
+                    "winner_id": rng.choice((p1_id, p2_id)),
+                    "stats": {"Player 1": random_stats(rng), "Player 2": random_stats(rng)},
+                })
+            insert_match_bundle((f"Synthetic Open {t:03d}", f"City {t:03d}", year), matches)
+            stats_rows += 2 * len(matches)
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {players} players, {seasons * tournaments_per_season} tournaments and "
+          f"{stats_rows} stats rows in {elapsed:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with deterministic synthetic data")
+    parser.add_argument("--url", help="database URL, e.g. sqlite:///bench.db (defaults to DATABASE_URL/.env)")
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument("--tournaments-per-season", type=int, default=20)
+    parser.add_argument("--matches-per-tournament", type=int, default=64)
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        os.environ["DATABASE_URL"] = args.url
+
+    generate(
+        seasons=args.seasons,
+        tournaments_per_season=args.tournaments_per_season,
+        matches_per_tournament=args.matches_per_tournament,
+        players=args.players,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
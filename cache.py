@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from db import get_data_version
+
+# "memory" (per process) or "disk" (one SQLite file shared by every gunicorn worker)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+CACHE_DISK_MAXSIZE = int(os.getenv("CACHE_DISK_MAXSIZE", "10000"))
+
+
+class MemoryStore:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskStore:
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value BLOB, accessed REAL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return pickle.loads(row[0])
+
+    def set(self, key, entry):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, accessed) VALUES (?, ?, ?)",
+                (key, pickle.dumps(entry), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+
+
+_disk_store = None
+
+
+def _get_store(maxsize):
+    global _disk_store
+    if CACHE_BACKEND == "disk":
+        if _disk_store is None:
+            _disk_store = DiskStore(os.path.join(CACHE_DIR, "queries.sqlite"), CACHE_DISK_MAXSIZE)
+        return _disk_store
+    return MemoryStore(maxsize)
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _copy(value):
+    # Callers mutate returned DataFrames/lists/arrays (e.g. adding plot columns); dict values
+    # (get_player_stat_matrix's arrays) are copied too, as a shallow dict copy would share them
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value.copy() if hasattr(value, "copy") else value
+
+
+def cached(maxsize=256, ttl=300):
+    """Caches a query function by its arguments until `ttl` seconds pass or data is ingested."""
+
+    def decorator(func):
+        store = _get_store(maxsize)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = repr((name, _freeze(args), _freeze(kwargs)))
+            if isinstance(store, DiskStore):
+                key = hashlib.sha256(key.encode()).hexdigest()
+
+            version = get_data_version()
+            entry = store.get(key)
+            if entry is not None:
+                entry_version, expires, value = entry
+                if entry_version == version and time.time() < expires:
+                    return _copy(value)
+
+            value = func(*args, **kwargs)
+            store.set(key, (version, time.time() + ttl, _copy(value)))
+            return value
+
+        wrapper.cache_clear = store.clear
+        return wrapper
+
+    return decorator
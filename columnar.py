@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+from sqlmodel import select
+import pandas as pd
+from db import get_engine, Match, Player, Stats, Tournament, ROUND_ORDER, STATS_KEYS
+
+# Partition directories: <root>/year=2025/tournament_id=12/part-<export>-<n>.parquet
+PARTITIONING = ds.partitioning(pa.schema([("year", pa.int32()), ("tournament_id", pa.int64())]), flavor="hive")
+STATS_COLUMNS = ["id", "match_id", "player_id", *STATS_KEYS]
+
+
+def _state_path(root):
+    return os.path.join(root, "_state.json")
+
+
+def _read_state(root):
+    try:
+        with open(_state_path(root)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"max_stats_id": 0, "exports": 0}
+
+
+def export_stats(root, chunk_size=100_000):
+    """Appends Stats rows newer than the last export to the Parquet snapshot under `root`."""
+    state = _read_state(root)
+    stmt = (
+        select(*(getattr(Stats, c) for c in STATS_COLUMNS),
+               Player.name.label("player_name"), Match.round, Match.played_on, Match.tournament_id, Tournament.year)
+        .join(Match, Match.id == Stats.match_id)
+        .join(Tournament, Tournament.id == Match.tournament_id)
+        .join(Player, Player.id == Stats.player_id)
+        .where(Stats.id > state["max_stats_id"])
+        .order_by(Stats.id)
+    )
+
+    exported = 0
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+        names = list(result.keys())
+        for chunk in result.partitions(chunk_size):
+            columns = list(zip(*chunk))
+            table = pa.table({name: list(values) for name, values in zip(names, columns)})
+            max_id = max(columns[0])
+            # Sorted by player so row-group statistics let player filters skip most of a file
+            table = table.sort_by([("player_id", "ascending"), ("match_id", "ascending")])
+            ds.write_dataset(
+                table, root, format="parquet", partitioning=PARTITIONING,
+                basename_template=f"part-{state['exports']:06d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+            )
+            state["exports"] += 1
+            state["max_stats_id"] = max_id
+            exported += len(chunk)
+            # Saved per chunk, so an interrupted export resumes after the last written rows
+            with open(_state_path(root), "w") as f:
+                json.dump(state, f)
+
+    print(f"Exported {exported} stats rows to {root} (up to id {state['max_stats_id']})")
+    return exported
+
+
+def open_dataset(root):
+    # Memory-mapped reads: pages come from the OS cache instead of being copied into Python
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING,
+                      filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def get_player_stat_values(root, player_id: int, stat: str) -> list[float]:
+    table = open_dataset(root).to_table(
+        columns=[stat],
+        filter=(ds.field("player_id") == player_id) & ds.field(stat).is_valid(),
+    )
+    return table.column(stat).to_pylist()
+
+
+def get_player_stats_across_matches(root, player_id: int, tournament_id: int):
+    table = open_dataset(root).to_table(
+        columns=[*STATS_COLUMNS, "player_name", "round", "played_on"],
+        filter=(ds.field("tournament_id") == tournament_id) & (ds.field("player_id") == player_id),
+    )
+    df = table.to_pandas().rename(columns={"player_name": "player"})
+    # Same shape and order as utils.get_player_stats_across_matches: latest date, then round, then id
+    # (the tournament, and so the year, is fixed by the filter)
+    order = pd.DataFrame({
+        "played_on": pd.to_datetime(df["played_on"]),
+        "round": df["round"].map(ROUND_ORDER).fillna(0),
+        "match_id": df["match_id"],
+    })
+    order = order.sort_values(by=["played_on", "round", "match_id"], ascending=False, na_position="last")
+    return df.loc[order.index].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # python columnar.py <snapshot_dir>
+    export_stats(sys.argv[1])
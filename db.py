@@ -1,21 +1,139 @@
-from sqlmodel import SQLModel, create_engine, Session, Field
+from sqlmodel import SQLModel, create_engine, Session, Field, select
+from sqlalchemy import Index, and_, bindparam, case, event, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import StaticPool
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from itertools import groupby
 from dotenv import load_dotenv
+import csv
+import io
 import os
+import sys
+import threading
+import time
+from sketch import sketch_add, sketch_from_values
 
-load_dotenv()
+# Engine settings per workload, picked with DB_PROFILE or configure_engine().
+# Engines are created on first use, so importing this module neither reads .env nor connects.
+PROFILES = {
+    # SQLAlchemy's defaults, for CLIs and scripts that did not pick a workload
+    "default": lambda url: {},
+    # Few long-lived connections, patient timeouts, large executemany batches
+    "scraper": lambda url: {
+        "pool_size": 2,
+        "max_overflow": 2,
+        "pool_timeout": 120,
+        "insertmanyvalues_page_size": 1000,
+    },
+    # Sized for gunicorn workers; every transaction is read-only and time-limited.
+    # Only deploy.py opts in; with REPLICA_PATH set it reads the SQLite replica instead
+    "dashboard": lambda url: {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": 10,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "connect_args": {"options": (
+            f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000')} "
+            "-c default_transaction_read_only=on"
+        )},
+    },
+    # Tests and benchmarks; "sqlite://" is one in-memory database shared by all sessions
+    "sqlite": lambda url: {
+        "connect_args": {"check_same_thread": False},
+        **({"poolclass": StaticPool} if url in ("sqlite://", "sqlite:///:memory:") else {}),
+    },
+}
 
-DB_ADDRESS = os.getenv("DB_ADDRESS")
-DB_USER = os.getenv("DB_USER")
-DB_PASS = os.getenv("DB_PASS")
-DB_HOST = os.getenv("DB_HOST")
-DB_NAME = os.getenv("DB_NAME")
+_env_loaded = False
+_default_profile = None
+_engines = {}
+_engines_lock = threading.Lock()
+_data_version = 0
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL, echo=True)
+def _load_env():
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
+
+def database_url():
+    _load_env()
+    # DATABASE_URL overrides the DB_* parts, e.g. sqlite:///bench.db for benchmarks
+    return os.getenv("DATABASE_URL") or (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASS')}"
+        f"@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+    )
+
+
+def configure_engine(profile):
+    # Sets the profile get_engine() uses when none is given, e.g. "dashboard" in deploy.py
+    global _default_profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown engine profile {profile!r}, expected one of {sorted(PROFILES)}")
+    _default_profile = profile
+
+
+def replica_url():
+    # Set REPLICA_PATH to serve dashboard reads from the SQLite file kept current by replica.py
+    _load_env()
+    path = os.getenv("REPLICA_PATH")
+    return f"sqlite:///file:{path}?mode=ro&uri=true" if path else None
+
+
+def get_engine(profile=None):
+    _load_env()
+    url = database_url()
+    # DB_PROFILE wins over configure_engine(), so a whole process can be pointed at SQLite
+    default_profile = os.getenv("DB_PROFILE") or _default_profile or "default"
+    profile = profile or default_profile
+    if profile == "dashboard" and replica_url():
+        # Read-only: the dashboard never waits on scraper writes, and cannot write by accident
+        profile = "replica"
+        url = replica_url()
+    elif url.startswith("sqlite") or default_profile == "sqlite":
+        # A single SQLite database (file or memory) serves every profile
+        profile = "sqlite"
+        if not url.startswith("sqlite"):
+            url = "sqlite://"
+
+    engine = _engines.get(profile)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(profile)
+            if engine is None:
+                echo = os.getenv("DB_ECHO", "").lower() in ("1", "true")
+                settings = PROFILES["sqlite" if profile == "replica" else profile](url)
+                engine = create_engine(url, echo=echo, **settings)
+                _engines[profile] = engine
+    return engine
+
+
+def dispose_engines():
+    # Closes and forgets every engine, so the next get_engine() rereads DATABASE_URL (tests switch databases)
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+def __getattr__(name):
+    # Keeps `db.engine` working without creating an engine at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class Tournament(SQLModel, table=True):
+    # Natural key: reruns of a crawl find the existing tournament instead of adding another
+    __table_args__ = (
+        Index("ux_tournament_name_city_year", "name", "city", "year", unique=True),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     name: str
     city: str
@@ -24,18 +142,53 @@ class Tournament(SQLModel, table=True):
 
 class Player(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
-    name: str = Field(index=True)
+    name: str = Field(index=True, unique=True)
 
 
 class Match(SQLModel, table=True):
+    # Keep in sync with migrations.py, which creates these on existing databases
+    __table_args__ = (
+        Index("ix_match_tournament_id", "tournament_id",
+              postgresql_include=["player1_id", "player2_id"]),
+        Index("ix_match_player1_id", "player1_id", "tournament_id"),
+        Index("ix_match_player2_id", "player2_id", "tournament_id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     tournament_id: int = Field(foreign_key="tournament.id")
     player1_id: int = Field(foreign_key="player.id")
     player2_id: int = Field(foreign_key="player.id")
     winner_id: int = Field(foreign_key="player.id")
+    # As printed on the results page, e.g. "Round of 32"; see ROUND_ORDER
+    round: str | None = None
+    played_on: date | None = None
+
+
+# Position of a round within a tournament, for ordering matches played on the same day
+# (or without a date); unknown labels sort first
+ROUND_ORDER = {
+    "1st Round Qualifying": 1,
+    "2nd Round Qualifying": 2,
+    "3rd Round Qualifying": 3,
+    "Round Robin": 4,
+    "Round of 128": 5,
+    "Round of 64": 6,
+    "Round of 32": 7,
+    "Round of 16": 8,
+    "Quarterfinals": 9,
+    "Quarter-Finals": 9,
+    "Semifinals": 10,
+    "Semi-Finals": 10,
+    "Final": 11,
+}
 
 
 class Stats(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_stats_match_id", "match_id", "player_id"),
+        Index("ix_stats_player_id", "player_id", "match_id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     match_id: int = Field(foreign_key="match.id")
     player_id: int = Field(foreign_key="player.id")
@@ -61,24 +214,113 @@ class Stats(SQLModel, table=True):
     total_points_won: float = 0.0
 
 
+class ScrapeCheckpoint(SQLModel, table=True):
+    # One row per crawled page: a match's stats URL or a tournament's results URL
+    id: int | None = Field(default=None, primary_key=True)
+    url: str = Field(index=True, unique=True)
+    kind: str  # "match" or "tournament"
+    tournament_id: int = Field(foreign_key="tournament.id")
+    match_id: int | None = Field(default=None, foreign_key="match.id")
+    status: str  # "done" or "failed"
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PlayerStatAggregate(SQLModel, table=True):
+    player_id: int = Field(foreign_key="player.id", primary_key=True)
+    stat: str = Field(primary_key=True)
+
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    min_value: float | None = None
+    max_value: float | None = None
+    sketch: str = "[]"
+
+
+class PlayerTournamentStatAggregate(SQLModel, table=True):
+    player_id: int = Field(foreign_key="player.id", primary_key=True)
+    tournament_id: int = Field(foreign_key="tournament.id", primary_key=True)
+    stat: str = Field(primary_key=True)
+
+    count: int = 0
+    total: float = 0.0
+    total_sq: float = 0.0
+    min_value: float | None = None
+    max_value: float | None = None
+    sketch: str = "[]"
+
+
+@contextmanager
+def count_statements(bind=None):
+    """Counts SQL statements sent to the database inside the block.
+
+        with count_statements() as counter:
+            list_matches_for_tournament(1)
+        assert counter["count"] == 1
+    """
+    bind = bind if bind is not None else get_engine()
+    counter = {"count": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+
+def bump_data_version():
+    # Called whenever rows land so cached query results (cache.py) are invalidated
+    global _data_version
+    _data_version += 1
+    # Shared with other processes (dashboard workers) when set
+    version_file = _data_version_file()
+    if version_file:
+        with open(version_file, "w") as f:
+            f.write(str(time.time_ns()))
+
+
+def _data_version_file():
+    _load_env()
+    return os.getenv("DATA_VERSION_FILE")
+
+
+def get_data_version():
+    file_version = None
+    version_file = _data_version_file()
+    if version_file:
+        try:
+            file_version = os.stat(version_file).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return _data_version, file_version
+
+
 def create_db():
-    SQLModel.metadata.create_all(engine)
+    from migrations import migrate  # migrations.py imports the models from here
+
+    SQLModel.metadata.create_all(get_engine("scraper"))
+    migrate()
 
 
 def insert_tournament(tournament_name, city, year):
     tournament = Tournament(name=tournament_name, city=city, year=year)
-    with Session(engine) as session:
+    with Session(get_engine("scraper")) as session:
         session.add(tournament)
         session.commit()
+        bump_data_version()
         session.refresh(tournament)
     return tournament.id
 
 
 def insert_player(player_name):
     player = Player(name=player_name)
-    with Session(engine) as session:
+    with Session(get_engine("scraper")) as session:
         session.add(player)
         session.commit()
+        bump_data_version()
         session.refresh(player)
     return player.id
 
@@ -90,40 +332,437 @@ def insert_match(tournament_id, player1_id, player2_id, winner_id):
         player2_id=player2_id,
         winner_id=winner_id
     )
-    with Session(engine) as session:
+    with Session(get_engine("scraper")) as session:
         session.add(match)
         session.commit()
+        bump_data_version()
         session.refresh(match)
     return match.id
 
 
+STATS_KEYS = {
+    "serve_rating": ("serve_rating", 0),
+    "aces": ("aces", 0),
+    "double_faults": ("double_faults", 0),
+    "first_serve": ("first_serve", 0.0),
+    "first_serve_points_won": ("1st_serve_points_won", 0.0),
+    "second_serve_points_won": ("2nd_serve_points_won", 0.0),
+    "break_points_saved": ("break_points_saved", 0.0),
+    "service_games_played": ("service_games_played", 0),
+    "return_rating": ("return_rating", 0),
+    "first_serve_return_points_won": ("1st_serve_return_points_won", 0.0),
+    "second_serve_return_points_won": ("2nd_serve_return_points_won", 0.0),
+    "break_points_converted": ("break_points_converted", 0.0),
+    "return_games_played": ("return_games_played", 0),
+    "net_points_won": ("net_points_won", 0.0),
+    "winners": ("winners", 0),
+    "unforced_errors": ("unforced_errors", 0),
+    "service_points_won": ("service_points_won", 0.0),
+    "return_points_won": ("return_points_won", 0.0),
+    "total_points_won": ("total_points_won", 0.0),
+}
+
+
+def stats_values(match_id, player_id, stats):
+    # Maps scraped stat keys (e.g. "1st_serve_points_won") onto Stats columns
+    values = {"match_id": match_id, "player_id": player_id}
+    for column, (key, default) in STATS_KEYS.items():
+        values[column] = stats.get(key, default)
+    return values
+
+
+def _apply_aggregates(session, model, key_columns, groups):
+    # One INSERT ... ON CONFLICT DO UPDATE, so concurrent writers adding the same new key merge
+    # instead of failing on the primary key. The sketch cannot be merged in SQL: the upsert leaves
+    # it alone and returns it, and rows that already existed get theirs rewritten below, while
+    # the upsert's row lock keeps other writers out until commit.
+    table = model.__table__
+    conn = session.connection()
+    # Sorted keys: writers lock shared rows in the same order and cannot deadlock
+    rows = _aggregate_rows(key_columns, dict(sorted(groups.items())))
+    stmt = _dialect_insert(conn)(table)
+    current, new = table.c, stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            "count": current.count + new.count,
+            "total": current.total + new.total,
+            "total_sq": current.total_sq + new.total_sq,
+            "min_value": case((current.min_value.is_(None) | (new.min_value < current.min_value), new.min_value),
+                              else_=current.min_value),
+            "max_value": case((current.max_value.is_(None) | (new.max_value > current.max_value), new.max_value),
+                              else_=current.max_value),
+        },
+    ).returning(*(current[c] for c in key_columns), current.count, current.sketch)
+
+    updates = []
+    for row in conn.execute(stmt, rows):
+        key, (count, sketch) = tuple(row[:len(key_columns)]), row[len(key_columns):]
+        values = groups[key]
+        # A fresh row holds exactly this batch and already has its sketch
+        if count > len(values):
+            updates.append({**{f"key_{c}": v for c, v in zip(key_columns, key)},
+                            "sketch": sketch_add(sketch, values)})
+    if updates:
+        conn.execute(
+            table.update().where(and_(*(table.c[c] == bindparam(f"key_{c}") for c in key_columns))),
+            updates,
+        )
+
+
+def update_aggregates(session, stats_rows, tournament_of_match):
+    # stats_rows are stats_values() dicts; runs inside the caller's transaction
+    per_player = defaultdict(list)
+    per_tournament = defaultdict(list)
+    for row in stats_rows:
+        tournament_id = tournament_of_match[row["match_id"]]
+        for stat in STATS_KEYS:
+            if row[stat] is None:
+                continue
+            value = float(row[stat])
+            per_player[(row["player_id"], stat)].append(value)
+            per_tournament[(row["player_id"], tournament_id, stat)].append(value)
+
+    if per_player:
+        _apply_aggregates(session, PlayerStatAggregate, ["player_id", "stat"], per_player)
+        _apply_aggregates(session, PlayerTournamentStatAggregate,
+                          ["player_id", "tournament_id", "stat"], per_tournament)
+
+
+def _aggregate_rows(key_columns, groups):
+    return [
+        {
+            **dict(zip(key_columns, key)),
+            "count": len(values),
+            "total": sum(values),
+            "total_sq": sum(v * v for v in values),
+            "min_value": min(values),
+            "max_value": max(values),
+            "sketch": sketch_from_values(values),
+        }
+        for key, values in groups.items()
+    ]
+
+
+def rebuild_aggregates(chunk_size=5000, player_ids=None, conn=None):
+    """Recomputes the aggregates of `player_ids` (every player when None) from Stats.
+
+    Runs in the transaction of `conn` when given (e.g. a migration), else in its own.
+    """
+    if conn is None:
+        with Session(get_engine("scraper")) as session:
+            rebuild_aggregates(chunk_size, player_ids, session.connection())
+            session.commit()
+        bump_data_version()
+        return
+
+    # One player at a time, so memory holds a single player's values and each sketch is built in one pass
+    stmt = (select(Stats.player_id, Match.tournament_id, *(getattr(Stats, c) for c in STATS_KEYS))
+            .join(Match, Match.id == Stats.match_id)
+            .order_by(Stats.player_id, Stats.id))
+    player_table = PlayerStatAggregate.__table__
+    tournament_table = PlayerTournamentStatAggregate.__table__
+    delete_player, delete_tournament = player_table.delete(), tournament_table.delete()
+    if player_ids is not None:
+        player_ids = sorted(set(player_ids))
+        stmt = stmt.where(Stats.player_id.in_(player_ids))
+        delete_player = delete_player.where(player_table.c.player_id.in_(player_ids))
+        delete_tournament = delete_tournament.where(tournament_table.c.player_id.in_(player_ids))
+    conn.execute(delete_player)
+    conn.execute(delete_tournament)
+
+    player_rows, tournament_rows = [], []
+    result = conn.execution_options(yield_per=chunk_size).execute(stmt)
+    for player_id, rows in groupby(result, key=lambda row: row[0]):
+        per_player = defaultdict(list)
+        per_tournament = defaultdict(list)
+        for _, tournament_id, *values in rows:
+            for stat, value in zip(STATS_KEYS, values):
+                if value is None:
+                    continue
+                per_player[(player_id, stat)].append(float(value))
+                per_tournament[(player_id, tournament_id, stat)].append(float(value))
+        player_rows.extend(_aggregate_rows(["player_id", "stat"], per_player))
+        tournament_rows.extend(_aggregate_rows(["player_id", "tournament_id", "stat"], per_tournament))
+        if len(tournament_rows) >= chunk_size:
+            conn.execute(insert(player_table), player_rows)
+            conn.execute(insert(tournament_table), tournament_rows)
+            player_rows, tournament_rows = [], []
+    if tournament_rows:
+        conn.execute(insert(player_table), player_rows)
+        conn.execute(insert(tournament_table), tournament_rows)
+
+
 def insert_stats(match_id, player_id, stats):
-    match_stats = Stats(
-        match_id=match_id,
-        player_id=player_id,
-        serve_rating=stats.get("serve_rating", 0),
-        aces=stats.get("aces", 0),
-        double_faults=stats.get("double_faults", 0),
-        first_serve=stats.get("first_serve", 0.0),
-        first_serve_points_won=stats.get("1st_serve_points_won", 0.0),
-        second_serve_points_won=stats.get("2nd_serve_points_won", 0.0),
-        break_points_saved=stats.get("break_points_saved", 0.0),
-        service_games_played=stats.get("service_games_played", 0),
-        return_rating=stats.get("return_rating", 0),
-        first_serve_return_points_won=stats.get("1st_serve_return_points_won", 0.0),
-        second_serve_return_points_won=stats.get("2nd_serve_return_points_won", 0.0),
-        break_points_converted=stats.get("break_points_converted", 0.0),
-        return_games_played=stats.get("return_games_played", 0),
-        net_points_won=stats.get("net_points_won", 0.0),
-        winners=stats.get("winners", 0),
-        unforced_errors=stats.get("unforced_errors", 0),
-        service_points_won=stats.get("service_points_won", 0.0),
-        return_points_won=stats.get("return_points_won", 0.0),
-        total_points_won=stats.get("total_points_won", 0.0),
-    )
-    with Session(engine) as session:
+    values = stats_values(match_id, player_id, stats)
+    match_stats = Stats(**values)
+    with Session(get_engine("scraper")) as session:
         session.add(match_stats)
+        match = session.get(Match, match_id)
+        update_aggregates(session, [values], {match_id: match.tournament_id})
+        session.commit()
+        bump_data_version()
+
+
+def _insert_returning_ids(conn, table, rows):
+    if not rows:
+        return []
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        # PostgreSQL (and SQLite >= 3.35): batched multi-row INSERT ... RETURNING
+        result = conn.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            rows,
+        )
+        return [row.id for row in result]
+    return [conn.execute(insert(table).values(**row)).inserted_primary_key[0] for row in rows]
+
+
+STATS_COPY_COLUMNS = ["match_id", "player_id", *STATS_KEYS]
+
+
+def _insert_stats_rows(conn, rows):
+    if not rows:
+        return
+    if conn.dialect.name != "postgresql":
+        conn.execute(insert(Stats.__table__), rows)
+        return
+
+    # COPY skips per-row statement handling; it runs on the session's DBAPI connection,
+    # so it is part of the same transaction
+    copy_sql = f"COPY stats ({', '.join(STATS_COPY_COLUMNS)}) FROM STDIN"
+    dbapi_conn = conn.connection.driver_connection
+    with dbapi_conn.cursor() as cursor:
+        if conn.dialect.driver == "psycopg":
+            with cursor.copy(copy_sql) as copy:
+                for row in rows:
+                    copy.write_row([row[c] for c in STATS_COPY_COLUMNS])
+        else:
+            # psycopg2: CSV, where an unquoted empty field is NULL
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow(["" if row[c] is None else row[c] for c in STATS_COPY_COLUMNS])
+            buffer.seek(0)
+            cursor.copy_expert(f"{copy_sql} WITH (FORMAT csv)", buffer)
+
+
+def insert_match_bundle(tournament, matches, aggregates=True):
+    """Writes a tournament and its matches with both players' stats in one transaction.
+
+    `tournament` is either an existing tournament id or a (name, city, year) tuple.
+    Each match is a dict with player1_id, player2_id, winner_id,
+    stats = {"Player 1": {...}, "Player 2": {...}} as returned by the scraper,
+    and optionally round and played_on.
+    Bulk loads pass aggregates=False and run rebuild_aggregates() once at the end.
+    Returns (tournament_id, match_ids).
+    """
+    start = time.perf_counter()
+    with Session(get_engine("scraper")) as session:
+        conn = session.connection()
+
+        if isinstance(tournament, int):
+            tournament_id = tournament
+        else:
+            tournament_id = _get_or_create_tournament(session, *tournament)
+
+        match_ids = _insert_returning_ids(conn, Match.__table__, [
+            {
+                "tournament_id": tournament_id,
+                "player1_id": m["player1_id"],
+                "player2_id": m["player2_id"],
+                "winner_id": m["winner_id"],
+                "round": m.get("round"),
+                "played_on": m.get("played_on"),
+            }
+            for m in matches
+        ])
+
+        stats_rows = []
+        for match_id, m in zip(match_ids, matches):
+            stats_rows.append(stats_values(match_id, m["player1_id"], m["stats"]["Player 1"]))
+            stats_rows.append(stats_values(match_id, m["player2_id"], m["stats"]["Player 2"]))
+        _insert_stats_rows(conn, stats_rows)
+        if stats_rows and aggregates:
+            update_aggregates(session, stats_rows, {match_id: tournament_id for match_id in match_ids})
+
+        # Same transaction as the rows, so a crash never leaves a match ingested but unrecorded
+        _upsert_checkpoints(conn, [
+            {"url": m["stats_url"], "kind": "match", "tournament_id": tournament_id,
+             "match_id": match_id, "status": "done"}
+            for match_id, m in zip(match_ids, matches) if m.get("stats_url")
+        ])
+
+        session.commit()
+        bump_data_version()
+
+    elapsed = time.perf_counter() - start
+    rows = len(match_ids) + len(stats_rows) + (0 if isinstance(tournament, int) else 1)
+    print(f"Inserted {rows} rows in {elapsed:.3f}s ({rows / elapsed:.0f} rows/s)")
+    return tournament_id, match_ids
+
+
+def _dialect_insert(conn):
+    # INSERT supporting ON CONFLICT, or None for other dialects
+    return {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(conn.dialect.name)
+
+
+def _insert_or_ignore(conn, table, values, conflict_columns):
+    # Returns the new id, or None when a row with the same key already exists
+    dialect_insert = _dialect_insert(conn)
+    if dialect_insert is None:
+        return None
+    stmt = (dialect_insert(table)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=conflict_columns)
+            .returning(table.c.id))
+    return conn.execute(stmt).scalar()
+
+
+def _get_or_create_tournament(session, name, city, year):
+    conn = session.connection()
+    values = {"name": name, "city": city, "year": year}
+    tournament_id = _insert_or_ignore(conn, Tournament.__table__, values, ["name", "city", "year"])
+    if tournament_id is None:
+        tournament_id = session.exec(select(Tournament.id).where(
+            (Tournament.name == name) & (Tournament.city == city) & (Tournament.year == year)
+        )).first()
+    if tournament_id is None:
+        tournament_id = _insert_returning_ids(conn, Tournament.__table__, [values])[0]
+    return tournament_id
+
+
+def get_or_create_tournament(name, city, year):
+    with Session(get_engine("scraper")) as session:
+        tournament_id = _get_or_create_tournament(session, name, city, year)
+        session.commit()
+    bump_data_version()
+    return tournament_id
+
+
+def _upsert_checkpoints(conn, rows):
+    if not rows:
+        return
+    now = datetime.now(timezone.utc)
+    rows = [{**row, "updated_at": now} for row in rows]
+    table = ScrapeCheckpoint.__table__
+    dialect_insert = _dialect_insert(conn)
+    if dialect_insert is None:
+        conn.execute(table.delete().where(table.c.url.in_([row["url"] for row in rows])))
+        conn.execute(insert(table), rows)
+        return
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["url"],
+        set_={c: stmt.excluded[c] for c in ("kind", "tournament_id", "match_id", "status", "updated_at")},
+    )
+    conn.execute(stmt, rows)
+
+
+def record_checkpoint(url, kind, tournament_id, status, match_id=None):
+    with Session(get_engine("scraper")) as session:
+        _upsert_checkpoints(session.connection(), [{
+            "url": url, "kind": kind, "tournament_id": tournament_id,
+            "match_id": match_id, "status": status,
+        }])
+        session.commit()
+
+
+def is_tournament_done(name, city, year):
+    with Session(get_engine("scraper")) as session:
+        return session.exec(
+            select(ScrapeCheckpoint.id)
+            .join(Tournament, Tournament.id == ScrapeCheckpoint.tournament_id)
+            .where(
+                (Tournament.name == name) & (Tournament.city == city) & (Tournament.year == year) &
+                (ScrapeCheckpoint.kind == "tournament") & (ScrapeCheckpoint.status == "done")
+            )
+        ).first() is not None
+
+
+def pending_descriptors(tournament_id, descriptors):
+    # Drops matches already ingested by an earlier (possibly interrupted) run
+    with Session(get_engine("scraper")) as session:
+        done = set(session.exec(
+            select(ScrapeCheckpoint.url).where(
+                (ScrapeCheckpoint.tournament_id == tournament_id) &
+                (ScrapeCheckpoint.kind == "match") & (ScrapeCheckpoint.status == "done")
+            )
+        ).all())
+    return [d for d in descriptors if d["stats_url"] not in done]
+
+
+def complete_tournament(tournament_id, result_url, descriptors):
+    # Marks the tournament done once every match with stats is ingested; returns whether it was
+    if pending_descriptors(tournament_id, descriptors):
+        return False
+    record_checkpoint(result_url, "tournament", tournament_id, "done")
+    return True
+
+
+class PlayerCache:
+    """Process-wide player name -> id map with LRU eviction."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm(self):
+        with Session(get_engine("scraper")) as session:
+            rows = session.exec(select(Player.id, Player.name).limit(self.maxsize)).all()
+        with self._lock:
+            for player_id, name in rows:
+                self._ids[name] = player_id
+
+    def get_or_create(self, name):
+        with self._lock:
+            player_id = self._ids.get(name)
+            if player_id is not None:
+                self._ids.move_to_end(name)
+                self.hits += 1
+                return player_id
+            self.misses += 1
+
+        player_id = upsert_player(name)
+        with self._lock:
+            self._ids[name] = player_id
+            self._ids.move_to_end(name)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+        return player_id
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def upsert_player(player_name):
+    with Session(get_engine("scraper")) as session:
+        player_id = _insert_or_ignore(session.connection(), Player.__table__, {"name": player_name}, ["name"])
         session.commit()
+        if player_id is not None:
+            bump_data_version()
+            return player_id
+        # Row already existed (or dialect without ON CONFLICT)
+        player_id = session.exec(select(Player.id).where(Player.name == player_name)).first()
+    if player_id is None:
+        player_id = insert_player(player_name)
+    return player_id
+
+
+player_cache = PlayerCache()
+
 
 if __name__ == "__main__":
-    create_db()
+    # python db.py [rebuild-aggregates]
+    if sys.argv[1:] == ["rebuild-aggregates"]:
+        rebuild_aggregates()
+    else:
+        create_db()
@@ -1,16 +1,27 @@
-from dash import Dash, html, dcc, callback, Output, Input
+from collections import Counter
+from dash import Dash, html, dcc, callback, Output, Input, State
+from flask import Response
 from plotly.subplots import make_subplots
+import pandas as pd
 import plotly.graph_objects as go
-from visualizing.utils import (list_tournaments,
-                               list_matches_for_tournament,
-                               get_match_stats,
-                               get_players_in_tournament,
-                               get_player_stats_across_matches,
-                               get_player_stat_values,
-                               list_players,
-                               engine)
-from sqlmodel import Session, select
-from db import Player, Tournament
+from db import configure_engine
+from metrics import instrument_sql, instrumented, render as render_metrics
+from similarity import similar_players
+from utils import (list_matches_for_tournament,
+                   get_match_stats,
+                   get_players_in_tournament,
+                   get_player_stats_across_matches,
+                   get_player_stat_matrix,
+                   get_player_stat_summary,
+                   get_player_form,
+                   search_players,
+                   search_tournaments,
+                   get_player_name,
+                   get_tournament_name,
+                   get_tournament_label)
+
+configure_engine("dashboard")
+instrument_sql()
 
 english_terms_dict = {
     "first_serve": "% попаданий 1-ой подачи",
@@ -35,107 +46,170 @@ def get_swap_dict(d):
 
 russian_terms_dict = get_swap_dict(english_terms_dict)
 
+# Dropdowns are filled server-side from the search text and show only the first page of
+# matches; anything further down is reached by typing more of the name
+DROPDOWN_PAGE_SIZE = 50
+SIMILAR_PLAYERS = 10
+# Rolling mean window (matches) and EWMA smoothing for the form chart
+FORM_WINDOW = 5
+FORM_ALPHA = 0.3
+
 app = Dash()
 
+
 # Requires Dash 2.17.0 or later
-app.layout = html.Div(
-    children=[
-        html.H1('Tennis Statistics', style={'textAlign': 'center', 'color': '#333'}),
-
-        html.Div([
-            html.H2("Анализ турнира"),
-            html.H3("Турнир"),
-            dcc.Dropdown(
-                options=[{'label': i[1], 'value': i[0]} for i in list_tournaments()],
-                id='tournament-dropdown',
-                value=1,
-                style={
-                        'backgroundColor': '#f1f2eb',
-                        'color': '#000',
-                        'border': '1px solid #999',
-                        'fontFamily': 'Helvetica'
-                        },
-            ),
+def serve_layout():
+    return html.Div(
+        children=[
+            html.H1('Tennis Statistics', style={'textAlign': 'center', 'color': '#333'}),
+
+            html.Div([
+                html.H2("Анализ турнира"),
+                html.H3("Турнир"),
+                dcc.Dropdown(
+                    id='tournament-dropdown',
+                    value=1,
+                    style={
+                            'backgroundColor': '#f1f2eb',
+                            'color': '#000',
+                            'border': '1px solid #999',
+                            'fontFamily': 'Helvetica'
+                            },
+                ),
+
+                html.H3("Игрок"),
+                dcc.Dropdown(id='player-dropdown',
+                             value=1,
+                             style={
+                                 'backgroundColor': '#f1f2eb',
+                                 'color': '#000',
+                                 'border': '1px solid #999',
+                             }
+                             ),
+                html.Div(
+                    dcc.Graph(id='line-plot'),
+                ),
+
+                html.H3("Матч"),
+                dcc.Dropdown(id='match-dropdown',
+                             value=1,
+                             style={
+                                 'backgroundColor': '#f1f2eb',
+                                 'color': '#000',
+                                 'border': '1px solid #999',
+                             }
+                             ),
+
+                dcc.Graph(id='spider-plot'),
+
+                html.Hr(),
+                html.H2("Анализ игрока"),
+                html.H3("Игрок"),
+                dcc.Dropdown(id='player-scatter-dropdown',
+                             value=1,
+                             style={
+                                 'backgroundColor': '#f1f2eb',
+                                 'color': '#000',
+                                 'border': '1px solid #999',
+                             }
+                             ),
+                html.H3("Первая метрика"),
+                dcc.Dropdown(id='stat1-dropdown',
+                             options=list(russian_terms_dict.keys()),
+                             value="% побед на подаче",
+                             style={
+                                 'backgroundColor': '#f1f2eb',
+                                 'color': '#000',
+                                 'border': '1px solid #999',
+                             }
+                             ),
+                html.H3("Вторая метрика"),
+                dcc.Dropdown(id='stat2-dropdown',
+                             options=list(russian_terms_dict.keys()),
+                             value="% побед на приеме",
+                             style={
+                                 'backgroundColor': '#f1f2eb',
+                                 'color': '#000',
+                                 'border': '1px solid #999',
+                             }
+                             ),
+
+                dcc.Graph(id='scatter-plot'),
+                dcc.Graph(id='stat-violin'),
+                # dcc.Graph(id='stat2-violin'),
+                dcc.Graph(id='form-plot'),
+
+                html.H3("Похожие игроки"),
+                dcc.RadioItems(id='similarity-metric',
+                               options=[
+                                   {'label': 'Косинусное расстояние', 'value': 'cosine'},
+                                   {'label': 'Евклидово расстояние', 'value': 'euclidean'},
+                               ],
+                               value='cosine',
+                               inline=True,
+                               ),
+                html.Div(id='similar-players'),
+
+            ], style={
+                'maxWidth': '1000px',
+                'margin': '0 auto',
+                'padding': '20px',
+            })
+        ],
+        style={
+            'backgroundColor': '#f1f2eb',
+            'minHeight': '100vh',
+            'padding': '20px',
+            'fontFamily': 'Helvetica'
+        }
+    )
 
-            html.H3("Игрок"),
-            dcc.Dropdown(id='player-dropdown',
-                         value=1,
-                         style={
-                             'backgroundColor': '#f1f2eb',
-                             'color': '#000',
-                             'border': '1px solid #999',
-                         }
-                         ),
-            html.Div(
-                dcc.Graph(id='line-plot'),
-            ),
 
-            html.H3("Матч"),
-            dcc.Dropdown(id='match-dropdown',
-                         value=1,
-                         style={
-                             'backgroundColor': '#f1f2eb',
-                             'color': '#000',
-                             'border': '1px solid #999',
-                         }
-                         ),
-
-            dcc.Graph(id='spider-plot'),
-
-            html.Hr(),
-            html.H2("Анализ игрока"),
-            html.H3("Игрок"),
-            dcc.Dropdown(id='player-scatter-dropdown',
-                         options=[{'label': i[1], 'value': i[0]} for i in list_players()],
-                         value=1,
-                         style={
-                             'backgroundColor': '#f1f2eb',
-                             'color': '#000',
-                             'border': '1px solid #999',
-                         }
-                         ),
-            html.H3("Первая метрика"),
-            dcc.Dropdown(id='stat1-dropdown',
-                         options=list(russian_terms_dict.keys()),
-                         value="% побед на подаче",
-                         style={
-                             'backgroundColor': '#f1f2eb',
-                             'color': '#000',
-                             'border': '1px solid #999',
-                         }
-                         ),
-            html.H3("Вторая метрика"),
-            dcc.Dropdown(id='stat2-dropdown',
-                         options=list(russian_terms_dict.keys()),
-                         value="% побед на приеме",
-                         style={
-                             'backgroundColor': '#f1f2eb',
-                             'color': '#000',
-                             'border': '1px solid #999',
-                         }
-                         ),
-
-            dcc.Graph(id='scatter-plot'),
-            dcc.Graph(id='stat-violin'),
-            # dcc.Graph(id='stat2-violin'),
-
-        ], style={
-            'maxWidth': '1000px',
-            'margin': '0 auto',
-            'padding': '20px',
-        })
-    ],
-    style={
-        'backgroundColor': '#f1f2eb',
-        'minHeight': '100vh',
-        'padding': '20px',
-        'fontFamily': 'Helvetica'
-    }
+# A function layout is built per page load, so startup does not touch the database
+app.layout = serve_layout
+
+
+@app.server.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def with_selected_option(options, value, get_label):
+    # Keep the current selection visible even when it is not on the returned page
+    if value is not None and all(o['value'] != value for o in options):
+        options.insert(0, {'label': get_label(value), 'value': value})
+    return options
+
+
+@callback(
+    Output('tournament-dropdown', 'options'),
+    Input('tournament-dropdown', 'search_value'),
+    State('tournament-dropdown', 'value'),
+)
+@instrumented
+def search_tournament_options(search_value, value):
+    options = [{'label': i[1], 'value': i[0]}
+               for i in search_tournaments(search_value or "", DROPDOWN_PAGE_SIZE)]
+    return with_selected_option(options, value, get_tournament_label)
+
+
+@callback(
+    Output('player-scatter-dropdown', 'options'),
+    Input('player-scatter-dropdown', 'search_value'),
+    State('player-scatter-dropdown', 'value'),
 )
+@instrumented
+def search_player_options(search_value, value):
+    options = [{'label': i[1], 'value': i[0]}
+               for i in search_players(search_value or "", DROPDOWN_PAGE_SIZE)]
+    return with_selected_option(options, value, get_player_name)
+
+
 @callback(
     Output('match-dropdown', 'options'),
     Input('tournament-dropdown', 'value')
 )
+@instrumented
 def set_player_options(selected_tournament):
     return [{'label': i[1], 'value': i[0]} for i in list_matches_for_tournament(selected_tournament)]
 
@@ -143,6 +217,7 @@ def set_player_options(selected_tournament):
     Output('spider-plot', 'figure'),
     Input('match-dropdown', 'value')
 )
+@instrumented
 def plot_spider_for_match(match_id):
     print(match_id)
     df = get_match_stats(match_id)
@@ -208,13 +283,25 @@ def plot_spider_for_match(match_id):
     Output('player-dropdown', 'options'),
     Input('tournament-dropdown', 'value')
 )
+@instrumented
 def set_match_options(selected_tournament):
     return [{'label': i[1], 'value': i[0]} for i in get_players_in_tournament(selected_tournament)]
+def match_labels(df):
+    # Round and date of each match; repeated labels (e.g. undated matches) are numbered
+    labels, seen = [], Counter()
+    for row in df.itertuples():
+        label = " ".join(str(part) for part in (row.round, row.played_on) if pd.notna(part)) or "Матч"
+        seen[label] += 1
+        labels.append(f"{label} #{seen[label]}" if seen[label] > 1 else label)
+    return labels
+
+
 @callback(
     Output('line-plot', 'figure'),
     Input('player-dropdown', 'value'),
     Input('tournament-dropdown', 'value'),
 )
+@instrumented
 def plot_stat_lines(player_id, tournament_id):
     df = get_player_stats_across_matches(player_id, tournament_id)
 
@@ -223,18 +310,14 @@ def plot_stat_lines(player_id, tournament_id):
         return
 
     categories = ["aces", "double_faults", "winners", "unforced_errors"]
-    df = df[["match_id"] + categories].sort_values(by="match_id", ascending=False)
-
-    df_plot = df.set_index("match_id").T
-    df_plot.columns = [str(mid) for mid in df_plot.columns]
+    # Rows come latest match first (utils.chronological)
+    df_plot = df[categories].T
+    df_plot.columns = match_labels(df)
     df_plot["stat"] = df_plot.index
 
 
-    with Session(engine) as session:
-        player = session.get(Player, player_id)
-        tournament = session.get(Tournament, tournament_id)
-        player_name = player.name if player else f"Player #{player_id}"
-        tournament_name = tournament.name if tournament else f"Tournament #{tournament_id}"
+    player_name = get_player_name(player_id)
+    tournament_name = get_tournament_name(tournament_id)
 
     stat_colors = {
         "aces": "#33658a",             # court blue
@@ -262,7 +345,7 @@ def plot_stat_lines(player_id, tournament_id):
         },
 
         xaxis=dict(
-            title="ID матча", # Ensures x-axis starts at 0
+            title="Раунд и дата матча",
         ),
         yaxis=dict(
             title="Количество",  # Ensures y-axis starts at 0
@@ -280,25 +363,33 @@ def plot_stat_lines(player_id, tournament_id):
 
 @callback(
     Output('scatter-plot', 'figure'),
+    Output('stat-violin', 'figure'),
     Input('player-scatter-dropdown', 'value'),
     Input('stat1-dropdown', 'value'),
     Input('stat2-dropdown', 'value')
 )
-def plot_stat_scatter(player_id: int, stat_x_r: str, stat_y_r: str):
+@instrumented
+def plot_stat_comparison(player_id: int, stat_x_r: str, stat_y_r: str):
+    # One callback for both figures: two callbacks on the same inputs fire together,
+    # both miss the cache (or run in different workers) and fetch the same rows twice
+    values = get_player_stat_matrix(player_id, [russian_terms_dict[stat_x_r], russian_terms_dict[stat_y_r]])
+    return (plot_stat_scatter(player_id, stat_x_r, stat_y_r, values),
+            draw_violins(player_id, stat_x_r, stat_y_r, values))
+
 
-    with Session(engine) as session:
-        player = session.get(Player, player_id)
-        player_name = player.name if player else f"Player #{player_id}"
+def plot_stat_scatter(player_id: int, stat_x_r: str, stat_y_r: str, values):
+
+    player_name = get_player_name(player_id)
 
     stat_x = russian_terms_dict[stat_x_r]
     stat_y = russian_terms_dict[stat_y_r]
 
     print(stat_x, stat_y)
-    x_vals = get_player_stat_values(player_id, stat_x)
-    y_vals = get_player_stat_values(player_id, stat_y)
+    x_vals = values[stat_x]
+    y_vals = values[stat_y]
 
-    x_range = [-0.03, 1.02] if all(0 <= x <= 1 for x in x_vals) else None
-    y_range = [-0.03, 1.02] if all(0 <= y <= 1 for y in y_vals) else None
+    x_range = [-0.03, 1.02] if ((x_vals >= 0) & (x_vals <= 1)).all() else None
+    y_range = [-0.03, 1.02] if ((y_vals >= 0) & (y_vals <= 1)).all() else None
 
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -332,11 +423,6 @@ def plot_stat_scatter(player_id: int, stat_x_r: str, stat_y_r: str):
     )
     return fig
 
-def get_stats(player_id: int, stat_r: str):
-    stat = russian_terms_dict[stat_r]
-    vals = get_player_stat_values(player_id, stat)
-    return vals
-
 def draw_violin(stat_name, stat_list, color):
     fig = go.Figure()
     fig.add_trace(go.Violin(
@@ -357,24 +443,25 @@ def draw_violin(stat_name, stat_list, color):
     )
     return fig
 
-@callback(
-    Output('stat-violin', 'figure'),
-    Input('player-scatter-dropdown', 'value'),
-    Input('stat1-dropdown', 'value'),
-    Input('stat2-dropdown', 'value'),
-)
-def draw_violins(player_id: int, stat_x_r: str, stat_y_r: str):
+def violin_title(player_id: int, stat_r: str):
+    title = f"Распределение показателя {stat_r}"
+    summary = get_player_stat_summary(player_id, russian_terms_dict[stat_r])
+    if summary:
+        title += f" (среднее {summary['mean']:.2f}, медиана {summary['median']:.2f})"
+    return title
+
+def draw_violins(player_id: int, stat_x_r: str, stat_y_r: str, values):
     fig = make_subplots(rows=1, cols=2, subplot_titles=(
-        f"Распределение показателя {stat_x_r}",
-        f"Распределение показателя {stat_y_r}"
+        violin_title(player_id, stat_x_r),
+        violin_title(player_id, stat_y_r)
     ), horizontal_spacing=0.07)
-    stat_list_1 = get_stats(player_id, stat_x_r)
+    stat_list_1 = values[russian_terms_dict[stat_x_r]]
     fig.add_trace(go.Violin(x=stat_list_1,
                             name='',
                             marker_color='#a13920'),
                   row=1, col=1)
 
-    stat_list_2 = get_stats(player_id, stat_y_r)
+    stat_list_2 = values[russian_terms_dict[stat_y_r]]
     fig.add_trace(go.Violin(x=stat_list_2,
                             name='',
                             marker_color='#6e4f37'),
@@ -393,5 +480,83 @@ def draw_violins(player_id: int, stat_x_r: str, stat_y_r: str):
     return fig
 
 
+def streak_label(streak: int):
+    if streak > 0:
+        return f"серия побед: {streak}"
+    return f"серия поражений: {-streak}"
+
+
+@callback(
+    Output('form-plot', 'figure'),
+    Input('player-scatter-dropdown', 'value'),
+    Input('stat1-dropdown', 'value'),
+)
+@instrumented
+def plot_form(player_id: int, stat_r: str):
+    df = get_player_form(player_id, russian_terms_dict[stat_r], FORM_WINDOW, FORM_ALPHA)
+    player_name = get_player_name(player_id)
+
+    fig = go.Figure()
+    if not df.empty:
+        x = list(range(1, len(df) + 1))
+        hover = [
+            " ".join(str(part) for part in (row.tournament, row.year, row.round, row.played_on) if part)
+            for row in df.itertuples()
+        ]
+        fig.add_trace(go.Scatter(
+            x=x, y=df["value"], mode='markers', name=stat_r, text=hover,
+            marker=dict(size=8, color=['#a3a702' if won else '#a13920' for won in df["won"]]),
+        ))
+        fig.add_trace(go.Scatter(
+            x=x, y=df["rolling_mean"], mode='lines', name=f"среднее за {FORM_WINDOW} матчей",
+            line=dict(color='#33658a'),
+        ))
+        fig.add_trace(go.Scatter(
+            x=x, y=df["ewma"], mode='lines', name="EWMA",
+            line=dict(color='#6e4f37', dash='dash'),
+        ))
+
+    title = f"Форма {player_name}: {stat_r}"
+    if not df.empty:
+        title += f" ({streak_label(int(df['streak'].iloc[-1]))})"
+    fig.update_layout(
+        title={
+            'text': title,
+            'x': 0.5,
+            'xanchor': 'center'
+        },
+        xaxis=dict(title="Матч (по порядку)"),
+        yaxis=dict(title=stat_r),
+        paper_bgcolor="#f1f2eb",
+        plot_bgcolor="#E9EAE3",
+        font=dict(family="Helvetica"),
+    )
+    return fig
+
+
+@callback(
+    Output('similar-players', 'children'),
+    Input('player-scatter-dropdown', 'value'),
+    Input('similarity-metric', 'value'),
+)
+@instrumented
+def show_similar_players(player_id: int, metric: str):
+    neighbours = similar_players(player_id, k=SIMILAR_PLAYERS, metric=metric)
+    if not neighbours:
+        return html.P("Недостаточно данных")
+
+    cell = {'padding': '4px 12px', 'borderBottom': '1px solid #ccc'}
+    header = html.Tr([html.Th(c, style=cell) for c in ("Игрок", "Матчей", "Расстояние")])
+    rows = [
+        html.Tr([
+            html.Td(get_player_name(neighbour_id), style=cell),
+            html.Td(matches, style=cell),
+            html.Td(f"{distance:.3f}", style=cell),
+        ])
+        for neighbour_id, distance, matches in neighbours
+    ]
+    return html.Table([header, *rows], style={'borderCollapse': 'collapse', 'backgroundColor': '#E9EAE3'})
+
+
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,203 @@
+import argparse
+import csv
+import json
+import time
+from datetime import date
+from itertools import islice
+from sqlalchemy.exc import SQLAlchemyError
+from sqlmodel import Session, select
+from db import (STATS_KEYS, Match, Tournament, configure_engine, get_engine, get_or_create_tournament,
+                insert_match_bundle, player_cache)
+
+# Stat columns are "p1_<key>" / "p2_<key>", where <key> is a scraped stat key
+# (e.g. "1st_serve_points_won") or the Stats column name (e.g. "first_serve_points_won")
+STAT_ALIASES = {}
+for _column, (_key, _default) in STATS_KEYS.items():
+    STAT_ALIASES[_key] = (_key, _default)
+    STAT_ALIASES[_column] = (_key, _default)
+
+
+def read_records(path):
+    # One dict per line/row; nothing beyond the current record is held in memory
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _number(value, default):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.endswith("%"):
+            # Percentages are stored as fractions, as the scraper does
+            return round(float(value[:-1]) / 100, 2)
+    if value is None or value == "":
+        return default
+    number = float(value)
+    return int(number) if isinstance(default, int) and number.is_integer() else number
+
+
+def to_match(record):
+    """Returns ((tournament, city, year), player1, player2, winner, stats, extra) for one file record."""
+    player1, player2 = record["player1"].strip(), record["player2"].strip()
+    if not player1 or not player2:
+        raise ValueError("missing player name")
+    stats = {"Player 1": {}, "Player 2": {}}
+    for field, value in record.items():
+        prefix, _, name = field.partition("_")
+        if prefix not in ("p1", "p2") or name not in STAT_ALIASES:
+            continue
+        key, default = STAT_ALIASES[name]
+        stats["Player 1" if prefix == "p1" else "Player 2"][key] = _number(value, default)
+    winner = (record.get("winner") or player1).strip()
+    tournament = (record["tournament"].strip(), (record.get("city") or "").strip(), int(record["year"]))
+    # Optional: round label and ISO date, used to order matches chronologically
+    extra = {
+        "round": (record.get("round") or "").strip() or None,
+        "played_on": date.fromisoformat(record["date"].strip()) if record.get("date") else None,
+    }
+    return tournament, player1, player2, winner, stats, extra
+
+
+class IdMap:
+    """Tournament natural key -> id, loaded once and extended as new tournaments appear."""
+
+    def __init__(self):
+        with Session(get_engine("scraper")) as session:
+            self.ids = {(t.name, t.city, t.year): t.id for t in session.exec(select(Tournament))}
+
+    def get(self, key):
+        tournament_id = self.ids.get(key)
+        if tournament_id is None:
+            tournament_id = self.ids[key] = get_or_create_tournament(*key)
+        return tournament_id
+
+
+def match_key(player1_id, player2_id, round_label, played_on):
+    # Natural key of a match within its tournament; either player may be listed first
+    return min(player1_id, player2_id), max(player1_id, player2_id), round_label, played_on
+
+
+class ExistingMatches:
+    """Natural keys of the stored matches, held only for tournaments with matches waiting to be written."""
+
+    def __init__(self):
+        self.keys = {}
+        self.pending = set()
+
+    def _load(self, tournament_id):
+        # Tournaments with nothing waiting are reloaded from the database if they come back
+        for idle in [t for t in self.keys if t not in self.pending]:
+            del self.keys[idle]
+        stmt = (select(Match.player1_id, Match.player2_id, Match.round, Match.played_on)
+                .where(Match.tournament_id == tournament_id))
+        with Session(get_engine("scraper")) as session:
+            keys = self.keys[tournament_id] = {match_key(*row) for row in session.exec(stmt)}
+        return keys
+
+    def add(self, tournament_id, match):
+        # False if the match is already stored or was earlier in the imported files
+        keys = self.keys[tournament_id] if tournament_id in self.keys else self._load(tournament_id)
+        key = match_key(match["player1_id"], match["player2_id"], match["round"], match["played_on"])
+        if key in keys:
+            if match["round"] is None and match["played_on"] is None:
+                raise ValueError("rematch without a round or date to tell it apart from the other match")
+            return False
+        keys.add(key)
+        self.pending.add(tournament_id)
+        return True
+
+    def flushed(self, tournament_id):
+        # The tournament's pending matches are in the database now
+        self.pending.discard(tournament_id)
+        self.keys.pop(tournament_id, None)
+
+
+def resolve(records, tournaments, existing, counts):
+    for n, record in enumerate(records, 1):
+        try:
+            tournament, player1, player2, winner, stats, extra = to_match(record)
+            tournament_id = tournaments.get(tournament)
+            p1_id = player_cache.get_or_create(player1)
+            p2_id = player_cache.get_or_create(player2)
+            match = {
+                "player1_id": p1_id,
+                "player2_id": p2_id,
+                "winner_id": p2_id if winner == player2 else p1_id,
+                "stats": stats,
+                **extra,
+            }
+            new = existing.add(tournament_id, match)
+        except (KeyError, ValueError, AttributeError, TypeError, OverflowError, SQLAlchemyError) as e:
+            print(f"Rejected record {n}: {e!r}")
+            counts["rejected"] += 1
+            continue
+        if not new:
+            counts["existing"] += 1
+            continue
+        yield tournament_id, match
+
+
+def batches(matches, batch_size, max_pending):
+    # One batch per tournament, as insert_match_bundle expects; memory is capped at max_pending matches
+    pending = {}
+    total = 0
+    for tournament_id, match in matches:
+        batch = pending.setdefault(tournament_id, [])
+        batch.append(match)
+        total += 1
+        if len(batch) >= batch_size:
+            total -= len(batch)
+            yield tournament_id, pending.pop(tournament_id)
+        elif total >= max_pending:
+            yield from pending.items()
+            pending, total = {}, 0
+    yield from pending.items()
+
+
+def import_files(paths, batch_size=5000, limit=None, aggregates=True):
+    player_cache.warm()
+    tournaments = IdMap()
+    existing = ExistingMatches()
+    counts = {"rejected": 0, "existing": 0}
+    imported = 0
+    start = time.perf_counter()
+
+    records = (record for path in paths for record in read_records(path))
+    if limit is not None:
+        records = islice(records, limit)
+    matches = resolve(records, tournaments, existing, counts)
+    for tournament_id, batch in batches(matches, batch_size, 4 * batch_size):
+        # Aggregates are merged batch by batch, so only the imported players' rows are touched
+        insert_match_bundle(tournament_id, batch, aggregates=aggregates)
+        # Runs before resolve() reads the next record, so its keys are reloaded with this batch in them
+        existing.flushed(tournament_id)
+        imported += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"Imported {imported} matches ({imported / elapsed:.0f} matches/s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Imported {imported} matches ({2 * imported} stats rows) in {elapsed:.1f}s, "
+          f"skipped {counts['existing']} already imported, rejected {counts['rejected']} records")
+    print(f"Player cache: {player_cache.stats()}")
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import historical match stats from CSV or JSONL files")
+    parser.add_argument("paths", nargs="+", help="*.csv, or *.jsonl/*.ndjson with one match per line")
+    parser.add_argument("--batch-size", type=int, default=5000, help="matches per transaction")
+    parser.add_argument("--limit", type=int, help="stop after this many records")
+    parser.add_argument("--skip-aggregates", action="store_true",
+                        help="do not update the stat aggregates (run 'python db.py rebuild-aggregates' afterwards)")
+    args = parser.parse_args()
+
+    configure_engine("scraper")
+    import_files(args.paths, args.batch_size, args.limit, aggregates=not args.skip_aggregates)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from db import player_cache
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# What the current thread is doing, so SQL statements can be attributed to a Dash callback
+current_scope = ContextVar("current_scope", default="none")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(dict(key))} {value}")
+        return lines
+
+    def summary(self):
+        with self._lock:
+            return {_label_text(dict(key)) or "total": value for key, value in sorted(self._values.items())}
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._series.items()):
+                labels = dict(key)
+                cumulative = 0
+                for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_label_text({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_count{_label_text(labels)} {count}")
+                lines.append(f"{self.name}_sum{_label_text(labels)} {total}")
+        return lines
+
+    def _quantile(self, counts, count, q):
+        # Upper bound of the bucket holding the q-th observation
+        target = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        with self._lock:
+            return {
+                _label_text(dict(key)) or "total": {
+                    "count": count,
+                    "sum": total,
+                    "mean": total / count if count else 0.0,
+                    "p50_le": self._quantile(counts, count, 0.5),
+                    "p95_le": self._quantile(counts, count, 0.95),
+                }
+                for key, (counts, count, total) in sorted(self._series.items())
+            }
+
+
+class Gauge:
+    """Value read from `func` when the metrics are collected."""
+
+    def __init__(self, name, help, func):
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.func()}"]
+
+    def summary(self):
+        return self.func()
+
+
+callback_seconds = Histogram("dash_callback_seconds", "Dash callback duration")
+sql_statements = Counter("sql_statements_total", "SQL statements executed, by callback")
+sql_seconds = Histogram("sql_statement_seconds", "SQL statement duration, by callback")
+scrape_seconds = Histogram("scrape_stage_seconds", "Time per stats page (load, parse) and per written batch (insert)")
+player_cache_hits = Gauge("player_cache_hits", "Player name lookups served from the cache",
+                          lambda: player_cache.stats()["hits"])
+player_cache_misses = Gauge("player_cache_misses", "Player name lookups that went to the database",
+                            lambda: player_cache.stats()["misses"])
+player_cache_hit_ratio = Gauge("player_cache_hit_ratio", "Share of player name lookups served from the cache",
+                               lambda: player_cache.stats()["hit_rate"])
+
+REGISTRY = [
+    callback_seconds, sql_statements, sql_seconds, scrape_seconds,
+    player_cache_hits, player_cache_misses, player_cache_hit_ratio,
+]
+
+
+def instrumented(func):
+    """Times a Dash callback; goes below @callback so Dash registers the wrapper."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_scope.set(func.__name__)
+        try:
+            with callback_seconds.time(callback=func.__name__):
+                return func(*args, **kwargs)
+        finally:
+            current_scope.reset(token)
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_start"].pop()
+    scope = current_scope.get()
+    sql_statements.inc(scope=scope)
+    sql_seconds.observe(elapsed, scope=scope)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("metrics_start"):
+        context.connection.info["metrics_start"].pop()
+
+
+def instrument_sql():
+    # Listens on the Engine class, so engines created lazily later are covered too
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    return {metric.name: metric.summary() for metric in REGISTRY}
+
+
+def write_summary(path):
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2)
+    print(f"Wrote metrics summary to {path}")
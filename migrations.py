@@ -0,0 +1,149 @@
+import sys
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, inspect, text
+from sqlmodel import SQLModel
+from db import bump_data_version, get_engine, rebuild_aggregates
+
+# Every statement is idempotent, so a migration is a no-op on a database that
+# create_all() just built from the current models.
+
+
+def _dedupe_players(conn):
+    # Point matches and stats at the lowest id for each name before enforcing uniqueness
+    duplicates = conn.execute(text(
+        "SELECT name, MIN(id) FROM player GROUP BY name HAVING COUNT(*) > 1"
+    )).all()
+    for name, keep_id in duplicates:
+        ids = [row[0] for row in conn.execute(
+            text("SELECT id FROM player WHERE name = :name AND id != :keep_id"),
+            {"name": name, "keep_id": keep_id},
+        )]
+        for old_id in ids:
+            params = {"old_id": old_id, "keep_id": keep_id}
+            for column in ("player1_id", "player2_id", "winner_id"):
+                conn.execute(text(f"UPDATE match SET {column} = :keep_id WHERE {column} = :old_id"), params)
+            conn.execute(text("UPDATE stats SET player_id = :keep_id WHERE player_id = :old_id"), params)
+            for table in ("playerstataggregate", "playertournamentstataggregate"):
+                conn.execute(text(f"DELETE FROM {table} WHERE player_id = :old_id"), params)
+            conn.execute(text("DELETE FROM player WHERE id = :old_id"), params)
+    if duplicates:
+        # The kept ids now hold the merged players' stats
+        rebuild_aggregates(player_ids=[keep_id for _, keep_id in duplicates], conn=conn)
+        print(f"Merged duplicate players and rebuilt their aggregates: {[name for name, _ in duplicates]}")
+
+
+def unique_player_names(conn):
+    _dedupe_players(conn)
+    conn.execute(text("DROP INDEX IF EXISTS ix_player_name"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_player_name ON player (name)"))
+
+
+def search_indexes(conn):
+    # Trigram indexes serve both prefix and substring ILIKE searches from the dashboard dropdowns
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_player_name_trgm ON player USING gin (name gin_trgm_ops)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_tournament_name_trgm ON tournament USING gin (name gin_trgm_ops)"))
+
+
+def query_indexes(conn):
+    include = " INCLUDE (player1_id, player2_id)" if conn.dialect.name == "postgresql" else ""
+    for statement in (
+        f"CREATE INDEX IF NOT EXISTS ix_match_tournament_id ON match (tournament_id){include}",
+        "CREATE INDEX IF NOT EXISTS ix_match_player1_id ON match (player1_id, tournament_id)",
+        "CREATE INDEX IF NOT EXISTS ix_match_player2_id ON match (player2_id, tournament_id)",
+        "CREATE INDEX IF NOT EXISTS ix_stats_match_id ON stats (match_id, player_id)",
+        "CREATE INDEX IF NOT EXISTS ix_stats_player_id ON stats (player_id, match_id)",
+    ):
+        conn.execute(text(statement))
+
+
+def unique_tournaments(conn):
+    # Reruns used to insert the same tournament again; keep the lowest id per (name, city, year)
+    duplicates = conn.execute(text(
+        "SELECT name, city, year, MIN(id) FROM tournament GROUP BY name, city, year HAVING COUNT(*) > 1"
+    )).all()
+    for name, city, year, keep_id in duplicates:
+        params = {"name": name, "city": city, "year": year, "keep_id": keep_id}
+        ids = [row[0] for row in conn.execute(text(
+            "SELECT id FROM tournament WHERE name = :name AND city = :city AND year = :year AND id != :keep_id"
+        ), params)]
+        for old_id in ids:
+            params = {"old_id": old_id, "keep_id": keep_id}
+            conn.execute(text("UPDATE match SET tournament_id = :keep_id WHERE tournament_id = :old_id"), params)
+            conn.execute(text("DELETE FROM playertournamentstataggregate WHERE tournament_id = :old_id"), params)
+            conn.execute(text("DELETE FROM tournament WHERE id = :old_id"), params)
+    if duplicates:
+        # Per-tournament aggregates of everyone who played in a merged tournament
+        player_ids = [row[0] for row in conn.execute(text(
+            "SELECT DISTINCT stats.player_id FROM stats JOIN match ON match.id = stats.match_id "
+            "WHERE match.tournament_id IN :keep_ids"
+        ).bindparams(bindparam("keep_ids", expanding=True)), {"keep_ids": [d[-1] for d in duplicates]})]
+        rebuild_aggregates(player_ids=player_ids, conn=conn)
+        print(f"Merged duplicate tournaments and rebuilt their aggregates: {[name for name, *_ in duplicates]}")
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_tournament_name_city_year ON tournament (name, city, year)"
+    ))
+
+
+def match_round_and_date(conn):
+    existing = {column["name"] for column in inspect(conn).get_columns("match")}
+    if "round" not in existing:
+        conn.execute(text("ALTER TABLE match ADD COLUMN round VARCHAR"))
+    if "played_on" not in existing:
+        conn.execute(text("ALTER TABLE match ADD COLUMN played_on DATE"))
+
+
+MIGRATIONS = [
+    (1, "unique player names", unique_player_names),
+    (2, "trigram search indexes", search_indexes),
+    (3, "match and stats query indexes", query_indexes),
+    (4, "unique tournament natural key", unique_tournaments),
+    (5, "match round and date", match_round_and_date),
+]
+
+
+def applied_versions(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migration "
+        "(version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at VARCHAR NOT NULL)"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migration"))}
+
+
+def migrate(bind=None):
+    bind = bind if bind is not None else get_engine("scraper")
+    with bind.begin() as conn:
+        applied = applied_versions(conn)
+
+    changed = False
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        # One transaction per migration, recorded together with its changes
+        with bind.begin() as conn:
+            upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migration (version, description, applied_at) "
+                     "VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description,
+                 "applied_at": datetime.now(timezone.utc).isoformat()},
+            )
+        print(f"Applied migration {version}: {description}")
+        changed = True
+    if changed:
+        # Merges move stats between ids; cached query results (cache.py) are stale
+        bump_data_version()
+
+
+if __name__ == "__main__":
+    # python migrations.py [status]
+    if sys.argv[1:] == ["status"]:
+        with get_engine("scraper").begin() as conn:
+            applied = applied_versions(conn)
+        for version, description, _ in MIGRATIONS:
+            print(f"{version:3d} {'applied' if version in applied else 'pending':8s} {description}")
+    else:
+        SQLModel.metadata.create_all(get_engine("scraper"))
+        migrate()
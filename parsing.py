@@ -0,0 +1,159 @@
+import re
+from datetime import datetime
+from urllib.parse import urljoin
+from lxml import html as lxml_html
+
+# Day headers on results pages, e.g. "Sun, 12 January, 2025 Day (8)"
+DAY_HEADER = re.compile(r"(\d{1,2}) ([A-Za-z]+),? (\d{4})")
+
+
+def normalize_stat_key(label: str) -> str:
+    return label.strip().lower().replace(" ", "_")
+
+
+def process_stat_value(val: str):
+    val = val.strip()
+    if '(' in val and '%' in val:
+        try:
+            perc = val[val.find('(') + 1 : val.find('%')].strip()
+            return round(float(perc) / 100, 2)
+        except:
+            pass
+    return int(val)
+
+
+def _has_class(cls):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+
+def _text(element):
+    return " ".join(element.text_content().split())
+
+
+def parse_stat_rows(rows):
+    # rows: (label, p1 value, p2 value) text triples, one per stat tile
+    stats = {
+        "Player 1": {},
+        "Player 2": {}
+    }
+
+    for raw_label, p1_stat, p2_stat in rows:
+        try:
+            label = normalize_stat_key(raw_label)
+            p1_value = process_stat_value(p1_stat)
+            p2_value = process_stat_value(p2_stat)
+        except Exception as e:
+            print(f"Skipped a stat block: {e}")
+            continue
+        stats["Player 1"][label] = p1_value
+        stats["Player 2"][label] = p2_value
+    return stats
+
+
+def parse_stats_html(page_html):
+    doc = lxml_html.fromstring(page_html)
+
+    rows = []
+    for section in doc.xpath(f"//div[{_has_class('statTileWrapper')}]"):
+        raw_label = section.xpath(f".//div[{_has_class('labelWrappper')}]/div")
+        p1_stat = section.xpath(f".//div[{_has_class('p1Stats')}]")
+        p2_stat = section.xpath(f".//div[{_has_class('p2Stats')}]")
+        if not (raw_label and p1_stat and p2_stat):
+            print("Skipped a stat block: missing label or values")
+            continue
+        rows.append((_text(raw_label[0]), _text(p1_stat[0]), _text(p2_stat[0])))
+    return parse_stat_rows(rows)
+
+
+def parse_match_date(text):
+    found = DAY_HEADER.search(text)
+    if not found:
+        return None
+    try:
+        return datetime.strptime(" ".join(found.groups()), "%d %B %Y").date()
+    except ValueError:
+        return None
+
+
+def _match_round(match):
+    # "<strong>Round of 32</strong> - Court 1" in the match header
+    header = match.xpath(f".//div[{_has_class('match-header')}]//strong")
+    if not header:
+        return None
+    return _text(header[0]) or None
+
+
+def _match_date(match):
+    day = match.xpath(f"preceding::div[{_has_class('tournament-day')}][1]")
+    return parse_match_date(_text(day[0])) if day else None
+
+
+def parse_results_html(page_html, result_url):
+    doc = lxml_html.fromstring(page_html)
+
+    descriptors = []
+    for match in doc.xpath(f"//div[{_has_class('match')}]"):
+        stats_links = match.xpath(f".//div[{_has_class('match-cta')}]//a[contains(@href, '/scores/')]")
+        if not stats_links:
+            print("No statistics for this match")
+            continue
+
+        players = match.xpath(f".//div[{_has_class('stats-item')}]")
+        if len(players) < 2:
+            continue
+        names = [_text(p.xpath(f".//div[{_has_class('name')}]//a")[0]) for p in players[:2]]
+        winners = [bool(p.xpath(f".//div[{_has_class('winner')}]")) for p in players[:2]]
+
+        descriptors.append({
+            "stats_url": urljoin(result_url, stats_links[0].get("href")),
+            "player1": names[0],
+            "player2": names[1],
+            # ATP marks the winning row; without the marker keep the old player 1 default
+            "winner": names[1] if winners[1] and not winners[0] else names[0],
+            "round": _match_round(match),
+            "played_on": _match_date(match),
+        })
+    return descriptors
+
+
+def parse_archive_html(page_html, archive_url):
+    doc = lxml_html.fromstring(page_html)
+
+    tournaments = []
+    for index, event in enumerate(doc.xpath(f"//ul[{_has_class('events')}]/li")):
+        profile = event.xpath(f".//a[{_has_class('tournament__profile')}]")
+        venue = event.xpath(f".//span[{_has_class('venue')}]")
+        if not (profile and venue):
+            continue
+        # The profile link also holds the dates; the name is its first line
+        lines = [t.strip() for t in profile[0].xpath(".//text()") if t.strip()]
+        result_links = event.xpath(f".//*[{_has_class('non-live-cta')}]//a")
+        tournaments.append({
+            # Position among all archive entries, including those skipped here (see scrape_atp.find_tournament)
+            "index": index,
+            "name": lines[0] if lines else "",
+            "city": _text(venue[0]).strip(" |"),
+            # Tournaments that have not been played yet have no results link
+            "result_url": urljoin(archive_url, result_links[0].get("href")) if result_links else None,
+        })
+    return tournaments
+
+
+def match_from_descriptor(descriptor, stats, player_id):
+    """Match dict for db.insert_match_bundle from a parse_results_html descriptor and its stats.
+
+    `player_id` maps a player name to an id, e.g. db.player_cache.get_or_create.
+    """
+    p1_name = descriptor["player1"]
+    p2_name = descriptor["player2"]
+    p1_id = player_id(p1_name)
+    p2_id = player_id(p2_name)
+    return {
+        "player1_id": p1_id,
+        "player2_id": p2_id,
+        "winner_id": p1_id if descriptor["winner"] == p1_name else p2_id,
+        "stats": stats,
+        "stats_url": descriptor["stats_url"],
+        "round": descriptor.get("round"),
+        "played_on": descriptor.get("played_on"),
+    }
@@ -0,0 +1,169 @@
+import asyncio
+import atexit
+import sys
+import time
+from db import (
+    complete_tournament, get_or_create_tournament, insert_match_bundle, is_tournament_done,
+    pending_descriptors, player_cache,
+)
+from metrics import instrument_sql, scrape_seconds, write_summary
+from parsing import match_from_descriptor, parse_stats_html
+from scrape_atp import Browser, record_failure, fetch_stats_html, find_tournament, harvest_results_page
+
+# Marks the end of a queue; each stage forwards it once all of its workers are done
+_DONE = None
+
+
+class TokenBucket:
+    """Allows `rate` page loads per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def _fetch(browser, bucket, tournament_id, urls, pages):
+    while (descriptor := await urls.get()) is not _DONE:
+        await bucket.acquire()
+        try:
+            with scrape_seconds.time(stage="load"):
+                page_html = await asyncio.to_thread(fetch_stats_html, browser, descriptor["stats_url"])
+        except Exception as e:
+            print(f"Skipped match {descriptor['player1']} vs {descriptor['player2']}: {e}")
+            await asyncio.to_thread(record_failure, tournament_id, descriptor)
+            continue
+        await pages.put((descriptor, page_html))
+
+
+async def _fetch_all(browsers, bucket, tournament_id, urls, pages):
+    await asyncio.gather(*(_fetch(b, bucket, tournament_id, urls, pages) for b in browsers))
+    await pages.put(_DONE)
+
+
+async def _parse(tournament_id, pages, parsed):
+    while (item := await pages.get()) is not _DONE:
+        descriptor, page_html = item
+        try:
+            with scrape_seconds.time(stage="parse"):
+                stats = await asyncio.to_thread(parse_stats_html, page_html)
+        except Exception as e:
+            # e.g. an empty or blocked page; the other pages go on
+            print(f"Skipped match {descriptor['player1']} vs {descriptor['player2']}: {e}")
+            await asyncio.to_thread(record_failure, tournament_id, descriptor)
+            continue
+        await parsed.put((descriptor, stats))
+    await parsed.put(_DONE)
+
+
+def _write_batch(tournament_id, batch):
+    try:
+        matches = [match_from_descriptor(descriptor, stats, player_cache.get_or_create) for descriptor, stats in batch]
+        with scrape_seconds.time(stage="insert"):
+            insert_match_bundle(tournament_id, matches)
+        return len(matches)
+    except Exception as e:
+        print(f"Failed to write {len(batch)} matches: {e}")
+        for descriptor, _ in batch:
+            record_failure(tournament_id, descriptor)
+        return 0
+
+
+async def _write(tournament_id, parsed, batch_size):
+    batch = []
+    written = 0
+    while (item := await parsed.get()) is not _DONE:
+        batch.append(item)
+        # Flush when the batch is full or the upstream stages have nothing ready
+        if len(batch) >= batch_size or parsed.empty():
+            written += await asyncio.to_thread(_write_batch, tournament_id, batch)
+            batch = []
+    if batch:
+        written += await asyncio.to_thread(_write_batch, tournament_id, batch)
+    return written
+
+
+async def _feed(urls, descriptors, workers):
+    for descriptor in descriptors:
+        await urls.put(descriptor)
+    for _ in range(workers):
+        await urls.put(_DONE)
+
+
+async def run_pipeline(browsers, tournament_id, descriptors, bucket, batch_size=16, queue_size=32):
+    """Fetches, parses and writes the stats pages of `descriptors` as overlapping stages.
+
+    Queues between stages are bounded, so a slow writer pauses fetching instead of
+    buffering a whole season in memory. If a stage fails, the others are cancelled and
+    the error is raised here, instead of the rest blocking on a queue nobody drains.
+    """
+    urls = asyncio.Queue(maxsize=queue_size)
+    pages = asyncio.Queue(maxsize=queue_size)
+    parsed = asyncio.Queue(maxsize=queue_size)
+
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(_feed(urls, descriptors, len(browsers))),
+        asyncio.create_task(_fetch_all(browsers, bucket, tournament_id, urls, pages)),
+        asyncio.create_task(_parse(tournament_id, pages, parsed)),
+        asyncio.create_task(_write(tournament_id, parsed, batch_size)),
+    ]
+    try:
+        *_, written = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    elapsed = time.perf_counter() - start
+    print(f"Pipeline wrote {written}/{len(descriptors)} matches in {elapsed:.1f}s "
+          f"({60 * written / elapsed:.1f} matches/min)")
+    return written
+
+
+async def scrape_tournament(index, year=2025, workers=2, rate=0.4, burst=2, store=None, profile=None):
+    player_cache.warm()
+    bucket = TokenBucket(rate, burst)
+    browsers = []
+    try:
+        for _ in range(workers):
+            browsers.append(await asyncio.to_thread(Browser, (0, 0), store, profile))
+
+        await bucket.acquire()
+        name, city, result_url = await asyncio.to_thread(find_tournament, browsers[0], index, year)
+        if not result_url:
+            print(f"Skipping {name} {year}: no results page yet")
+            return
+        if await asyncio.to_thread(is_tournament_done, name, city, year):
+            print(f"Skipping {name} {year}: already scraped")
+            return
+        tournament_id = await asyncio.to_thread(get_or_create_tournament, name, city, year)
+        await bucket.acquire()
+        descriptors = await asyncio.to_thread(harvest_results_page, browsers[0], result_url)
+        pending = await asyncio.to_thread(pending_descriptors, tournament_id, descriptors)
+        await run_pipeline(browsers, tournament_id, pending, bucket)
+        await asyncio.to_thread(complete_tournament, tournament_id, result_url, descriptors)
+    finally:
+        for browser in browsers:
+            browser.quit()
+    print(f"Player cache: {player_cache.stats()}")
+
+
+if __name__ == "__main__":
+    # python pipeline.py <tournament index> [year]
+    instrument_sql()
+    atexit.register(write_summary, "scrape_metrics.json")
+    asyncio.run(scrape_tournament(int(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 2025))
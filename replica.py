@@ -0,0 +1,113 @@
+import argparse
+import os
+import time
+from sqlalchemy import create_engine, func, insert, select
+from sqlmodel import Session, SQLModel
+from db import (Match, Player, PlayerStatAggregate, PlayerTournamentStatAggregate, Stats, Tournament,
+                bump_data_version, get_engine, update_aggregates)
+
+# Copied by id, parents first
+TABLES = [Tournament, Player, Match, Stats]
+AGGREGATES = [PlayerStatAggregate, PlayerTournamentStatAggregate]
+# Ids just below the replica's maximum are checked again on every sync, since a writer
+# can commit a lower id after a higher one is already visible
+OVERLAP = 1000
+
+
+def open_replica(path):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine, tables=[model.__table__ for model in TABLES + AGGREGATES])
+    # WAL lets the dashboard keep reading while a sync writes
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    return engine
+
+
+def _new_rows(source, target, stmt, table, chunk_size):
+    # Yields chunks of source rows (as dicts) that the replica does not have yet
+    local_max = target.execute(select(func.max(table.c.id))).scalar() or 0
+    low = max(local_max - OVERLAP, 0)
+    present = set(target.execute(select(table.c.id).where(table.c.id > low)).scalars())
+    result = source.execution_options(stream_results=True, yield_per=chunk_size).execute(
+        stmt.where(table.c.id > low).order_by(table.c.id)
+    )
+    for chunk in result.mappings().partitions(chunk_size):
+        rows = [dict(row) for row in chunk if row["id"] not in present]
+        if rows:
+            yield rows
+
+
+def sync(path, chunk_size=10_000):
+    """Copies rows added to the main database since the last sync into the SQLite replica at `path`.
+
+    Rows are only ever appended; after merges or deletes in the main database
+    (e.g. migrations) rebuild the replica with --full.
+    """
+    start = time.perf_counter()
+    target_engine = open_replica(path)
+    copied = {}
+    with get_engine("scraper").connect() as source, Session(target_engine) as session:
+        if source.dialect.name == "postgresql":
+            # One snapshot for every table, so stats never arrive without their matches
+            source = source.execution_options(isolation_level="REPEATABLE READ")
+        target = session.connection()
+        initial = target.execute(select(func.count()).select_from(Stats.__table__)).scalar() == 0
+
+        for model in TABLES[:-1]:
+            table = model.__table__
+            copied[table.name] = 0
+            for rows in _new_rows(source, target, select(table), table, chunk_size):
+                target.execute(insert(table), rows)
+                copied[table.name] += len(rows)
+
+        stats = Stats.__table__
+        copied[stats.name] = 0
+        stmt = select(stats, Match.tournament_id).join(Match, Match.id == stats.c.match_id)
+        for rows in _new_rows(source, target, stmt, stats, chunk_size):
+            tournament_of_match = {row["match_id"]: row.pop("tournament_id") for row in rows}
+            target.execute(insert(stats), rows)
+            if not initial:
+                update_aggregates(session, rows, tournament_of_match)
+            copied[stats.name] += len(rows)
+
+        if initial:
+            # First sync: take the main database's aggregates instead of merging them chunk by chunk
+            for model in AGGREGATES:
+                table = model.__table__
+                target.execute(table.delete())
+                result = source.execution_options(stream_results=True, yield_per=chunk_size).execute(select(table))
+                for chunk in result.mappings().partitions(chunk_size):
+                    target.execute(insert(table), [dict(row) for row in chunk])
+        session.commit()
+
+    target_engine.dispose()
+    if any(copied.values()):
+        bump_data_version()
+    elapsed = time.perf_counter() - start
+    print(f"Synced replica {path} in {elapsed:.1f}s: "
+          + ", ".join(f"{count} {name}" for name, count in copied.items()))
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep a local read-only SQLite replica for the dashboard")
+    parser.add_argument("path", nargs="?", default=os.getenv("REPLICA_PATH"),
+                        help="replica file (defaults to REPLICA_PATH)")
+    parser.add_argument("--interval", type=float, help="sync every this many seconds instead of once")
+    parser.add_argument("--full", action="store_true", help="rebuild the replica from scratch first")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("no replica path given and REPLICA_PATH is not set")
+
+    if args.full:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+    sync(args.path)
+    while args.interval:
+        time.sleep(args.interval)
+        sync(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,438 @@
+import argparse
+import atexit
+import os
 import time
 import random
+import queue
+import threading
+from collections import deque
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from db import insert_tournament, insert_player, insert_match, insert_stats, Session, Player, engine
-from sqlalchemy import select
+from db import (
+    complete_tournament, configure_engine, get_or_create_tournament, insert_match_bundle, is_tournament_done,
+    pending_descriptors, player_cache, record_checkpoint,
+)
+from metrics import instrument_sql, scrape_seconds, write_summary
+from parsing import match_from_descriptor, parse_archive_html, parse_results_html, parse_stat_rows
+from snapshots import SnapshotStore
 
-options = uc.ChromeOptions()
-options.headless = False
-driver = uc.Chrome(options=options)
-wait = WebDriverWait(driver, 20)
+configure_engine("scraper")
 
+ARCHIVE_URL = "https://www.atptour.com/en/scores/results-archive?year={year}"
 
-def open_and_wait(url):
-    driver.get(url)
-    time.sleep(random.uniform(2, 4))
+# Returns one [label, p1, p2] triple per stat tile, so a page costs a single WebDriver call
+EXTRACT_STAT_TILES_JS = """
+return Array.from(document.querySelectorAll('div.statTileWrapper')).map(function (tile) {
+    var label = tile.querySelector('div.labelWrappper > div');
+    var p1 = tile.querySelector('div.p1Stats');
+    var p2 = tile.querySelector('div.p2Stats');
+    return label && p1 && p2 ? [label.innerText, p1.innerText, p2.innerText] : null;
+});
+"""
 
+# Per stats page: url, extraction mode, load and extraction seconds
+page_timings = deque(maxlen=1000)
 
-def get_or_create_player(name: str, ranking: int = 0) -> int:
-    with Session(engine) as session:
-        statement = select(Player).where(Player.name == name)
-        player = session.exec(statement).first()
-        if player:
-            player = player[0]
-            return player.id
-    return insert_player(name)
+# undetected_chromedriver patches its binary on start, so drivers are created one at a time
+_driver_lock = threading.Lock()
 
+# Requests the lean profile never makes (Network.setBlockedURLs wildcards): images, media,
+# fonts, and ad/tracker hosts. Stylesheets stay, the selectors we wait for may depend on them.
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*doubleclick.net*", "*googlesyndication.com*", "*google-analytics.com*", "*googletagmanager.com*",
+    "*/pagead/*", "*facebook.net*", "*scorecardresearch.com*", "*adnxs.com*", "*amazon-adsystem.com*",
+    "*hotjar.com*", "*taboola.com*", "*outbrain.com*", "*criteo.com*", "*onetrust.com*",
+]
 
-def normalize_stat_key(label: str) -> str:
-    return label.strip().lower().replace(" ", "_")
+# Picked with BROWSER_PROFILE or the profile argument of Browser/ScraperPool.
+# recycle_after: pages before the driver is restarted, capping Chrome's memory growth.
+# spacing: "after_load" sleeps the politeness delay after every load; "start" only spaces
+# load starts that far apart, so time spent loading and parsing counts towards the delay.
+BROWSER_PROFILES = {
+    "default": {"headless": False, "page_load_strategy": "normal", "blocked_urls": [], "recycle_after": None,
+                "spacing": "after_load"},
+    "lean": {"headless": True, "page_load_strategy": "eager", "blocked_urls": BLOCKED_URLS, "recycle_after": 200,
+             "spacing": "start"},
+}
 
 
-def process_stat_value(val: str):
-    val = val.strip()
-    if '(' in val and '%' in val:
-        try:
-            perc = val[val.find('(') + 1 : val.find('%')].strip()
-            return round(float(perc) / 100, 2)
-        except:
-            pass
-    return int(val)
+class Browser:
+    def __init__(self, delay=(2, 4), store=None, profile=None):
+        profile = profile or os.getenv("BROWSER_PROFILE", "default")
+        if profile not in BROWSER_PROFILES:
+            raise ValueError(f"Unknown browser profile {profile!r}, expected one of {sorted(BROWSER_PROFILES)}")
+        self.profile = BROWSER_PROFILES[profile]
+        self.delay = delay
+        self.store = store
+        self.pages = 0
+        self._last_load = 0.0
+        self._start()
+
+    def _start(self):
+        options = uc.ChromeOptions()
+        options.page_load_strategy = self.profile["page_load_strategy"]
+        with _driver_lock:
+            self.driver = uc.Chrome(options=options, headless=self.profile["headless"])
+        if self.profile["blocked_urls"]:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.profile["blocked_urls"]})
+        self.wait = WebDriverWait(self.driver, 20)
+
+    def throttle(self):
+        # Politeness, before a load: with "start" spacing, loads start at least `delay` seconds apart
+        if self.profile["spacing"] != "start":
+            return
+        remaining = self._last_load + random.uniform(*self.delay) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self._last_load = time.monotonic()
+
+    def rest(self):
+        # Politeness, after a load: with "after_load" spacing, a random `delay` sleep
+        if self.profile["spacing"] == "after_load":
+            time.sleep(random.uniform(*self.delay))
+
+    def load(self, url, selector):
+        # Returns once `selector` matches, without waiting for the rest of the page
+        recycle_after = self.profile["recycle_after"]
+        if recycle_after and self.pages and self.pages % recycle_after == 0:
+            self.driver.quit()
+            self._start()
+        self.driver.get(url)
+        self.pages += 1
+        return self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, selector)))
+
+    def snapshot(self, url):
+        if self.store is not None:
+            self.store.put(url, self.driver.page_source)
 
+    def quit(self):
+        self.driver.quit()
 
-def scrape_stats_page(stats_url):
-    open_and_wait(stats_url)
 
-    stats = {
-        "Player 1": {},
-        "Player 2": {}
-    }
+def open_and_wait(browser, url, selector):
+    browser.throttle()
+    elements = browser.load(url, selector)
+    browser.rest()
+    return elements
 
-    stat_sections = wait.until(EC.presence_of_all_elements_located(
-        (By.CSS_SELECTOR, "div.statTileWrapper")
-    ))
 
+def get_or_create_player(name: str, ranking: int = 0) -> int:
+    return player_cache.get_or_create(name)
+
+
+def _extract_stat_tiles_elements(stat_sections):
+    rows = []
     for section in stat_sections:
         try:
             raw_label = section.find_element(By.CSS_SELECTOR, "div.labelWrappper > div").text
-            label = normalize_stat_key(raw_label)
             p1_stat = section.find_element(By.CSS_SELECTOR, "div.p1Stats").text
             p2_stat = section.find_element(By.CSS_SELECTOR, "div.p2Stats").text
-
-            stats["Player 1"][label] = process_stat_value(p1_stat)
-            stats["Player 2"][label] = process_stat_value(p2_stat)
+            rows.append((raw_label, p1_stat, p2_stat))
         except Exception as e:
             print(f"Skipped a stat block: {e}")
+    return rows
+
+
+def _extract_stat_tiles_script(browser):
+    tiles = browser.driver.execute_script(EXTRACT_STAT_TILES_JS)
+    rows = [tile for tile in tiles if tile]
+    if len(rows) < len(tiles):
+        print(f"Skipped {len(tiles) - len(rows)} stat blocks: missing label or values")
+    return rows
+
+
+def scrape_stats_page(browser, stats_url, mode="script"):
+    browser.throttle()
+    start = time.perf_counter()
+    stat_sections = browser.load(stats_url, "div.statTileWrapper")
+    browser.snapshot(stats_url)
+    loaded = time.perf_counter()
+    browser.rest()
+
+    if mode == "script":
+        rows = _extract_stat_tiles_script(browser)
+    else:
+        rows = _extract_stat_tiles_elements(stat_sections)
+    stats = parse_stat_rows(rows)
+
+    extracted = time.perf_counter()
+    page_timings.append({
+        "url": stats_url,
+        "mode": mode,
+        "load_s": loaded - start,
+        "extract_s": extracted - loaded,
+    })
+    scrape_seconds.observe(loaded - start, stage="load")
+    scrape_seconds.observe(extracted - loaded, stage="parse")
     return stats
 
 
+def fetch_stats_html(browser, stats_url):
+    # No politeness delay here: callers rate-limit (see pipeline.TokenBucket)
+    browser.load(stats_url, "div.statTileWrapper")
+    browser.snapshot(stats_url)
+    return browser.driver.page_source
+
+
+def harvest_results_page(browser, result_url):
+    open_and_wait(browser, result_url, "div.match")
+    browser.snapshot(result_url)
+    return parse_results_html(browser.driver.page_source, result_url)
 
-def scrape_tournament_by_index(index, year=2025):
-    open_and_wait(f"https://www.atptour.com/en/scores/results-archive?year={year}")
 
-    tournament_elements = wait.until(EC.presence_of_all_elements_located(
-        (By.CSS_SELECTOR, "ul.events > li")
-    ))
+def record_failure(tournament_id, match):
+    # Failed matches stay pending, so the next run retries them
+    try:
+        record_checkpoint(match["stats_url"], "match", tournament_id, "failed")
+    except Exception as e:
+        print(f"Failed to record checkpoint for {match['stats_url']}: {e}")
 
-    tournament_el = tournament_elements[index]
 
-    name = tournament_el.find_element(By.CSS_SELECTOR, "a.tournament__profile").text.split('\n')[0]
-    city = tournament_el.find_element(By.CSS_SELECTOR, "span.venue").text.strip(" |")
-    tournament_id = insert_tournament(name, city, year)
+class ScraperPool:
+    """N browser workers scraping stats pages from a shared queue into one DB writer."""
 
-    result_url = tournament_el.find_element(By.CSS_SELECTOR, ".non-live-cta a").get_attribute("href")
-    open_and_wait(result_url)
+    def __init__(self, workers=2, batch_size=16, delay=(2, 4), store=None, profile=None):
+        self.batch_size = batch_size
+        self.tasks = queue.Queue()
+        self.results = queue.Queue(maxsize=workers * batch_size)
+        self.browsers = []
+        try:
+            for _ in range(workers):
+                self.browsers.append(Browser(delay=delay, store=store, profile=profile))
+        except Exception:
+            self._quit_browsers()
+            raise
+
+        self.threads = [threading.Thread(target=self._work, args=(b,), daemon=True) for b in self.browsers]
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        for thread in self.threads:
+            thread.start()
+        self.writer.start()
+
+    def __enter__(self):
+        return self
 
-    match_count = len(wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.match"))))
+    def __exit__(self, *exc):
+        self.close()
 
-    for i in range(match_count):
-        open_and_wait(result_url)
-        matches = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.match")))
-        match = matches[i]
+    def submit(self, tournament_id, descriptors):
+        for descriptor in descriptors:
+            self.tasks.put((tournament_id, descriptor))
 
+    def join(self):
+        # Returns once every submitted match is scraped and written
+        self.tasks.join()
+        self.results.join()
+
+    def close(self):
         try:
-            stats_link = match.find_element(By.CSS_SELECTOR, "div.match-cta a[href*='/scores/']")
-            stats_url = stats_link.get_attribute("href")
-            stats = scrape_stats_page(stats_url)
-
-            player_elements = driver.find_elements(By.CSS_SELECTOR, "div.names a")
-            p1_name = player_elements[0].text.strip()
-            p2_name = player_elements[1].text.strip()
-            p1_id = get_or_create_player(p1_name, 1)
-            p2_id = get_or_create_player(p2_name, 2)
-            winner_id = p1_id
-            match_id = insert_match(tournament_id, p1_id, p2_id, winner_id)
-            insert_stats(match_id, p1_id, stats["Player 1"])
-            insert_stats(match_id, p2_id, stats["Player 2"])
-            print(f"Inserted match: {p1_name} vs {p2_name}")
-        except Exception as e:
-            print("No statistics for this match")
+            for _ in self.threads:
+                self.tasks.put(None)
+            for thread in self.threads:
+                thread.join()
+            self.results.put(None)
+            self.writer.join()
+        finally:
+            self._quit_browsers()
+
+    def _quit_browsers(self):
+        for browser in self.browsers:
+            try:
+                browser.quit()
+            except Exception as e:
+                print(f"Failed to quit browser: {e}")
+
+    def _work(self, browser):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                tournament_id, descriptor = task
+                stats = scrape_stats_page(browser, descriptor["stats_url"])
+                self.results.put((tournament_id, descriptor, stats))
+            except Exception as e:
+                print(f"Skipped match {task[1]['player1']} vs {task[1]['player2']}: {e}")
+                record_failure(task[0], task[1])
+            finally:
+                self.tasks.task_done()
+
+    def _write(self):
+        batches = {}
+        pending = 0
+
+        def flush():
+            nonlocal pending
+            for tournament_id, matches in batches.items():
+                try:
+                    with scrape_seconds.time(stage="insert"):
+                        insert_match_bundle(tournament_id, matches)
+                except Exception as e:
+                    print(f"Failed to write {len(matches)} matches: {e}")
+                    for match in matches:
+                        record_failure(tournament_id, match)
+            batches.clear()
+            for _ in range(pending):
+                self.results.task_done()
+            pending = 0
+
+        while True:
+            try:
+                item = self.results.get(timeout=1)
+            except queue.Empty:
+                flush()
+                continue
+            if item is None:
+                flush()
+                self.results.task_done()
+                return
+
+            tournament_id, descriptor, stats = item
+            pending += 1
+            try:
+                batches.setdefault(tournament_id, []).append(match_from_descriptor(descriptor, stats, player_cache.get_or_create))
+                print(f"Scraped match: {descriptor['player1']} vs {descriptor['player2']}")
+            except Exception as e:
+                print(f"Skipped match {descriptor['player1']} vs {descriptor['player2']}: {e}")
+                record_failure(tournament_id, descriptor)
+            if pending >= self.batch_size:
+                flush()
+
+
+def list_tournaments(browser, year):
+    archive_url = ARCHIVE_URL.format(year=year)
+    open_and_wait(browser, archive_url, "ul.events > li")
+    browser.snapshot(archive_url)
+    return parse_archive_html(browser.driver.page_source, archive_url)
+
+
+def find_tournament(browser, index, year):
+    # `index` counts every entry of the archive page, as scrape_tournament_by_index always has
+    for tournament in list_tournaments(browser, year):
+        if tournament["index"] == index:
+            return tournament["name"], tournament["city"], tournament["result_url"]
+    raise IndexError(f"No tournament at position {index} of the {year} results archive")
+
+
+def format_report(report):
+    if report["status"] == "skipped":
+        return f"{report['year']} {report['name']} ({report['city']}): already scraped"
+    if report["status"] == "no results":
+        return f"{report['year']} {report['name']} ({report['city']}): no results page yet"
+    rate = 60 * report["written"] / report["elapsed_s"] if report["elapsed_s"] else 0.0
+    return (f"{report['year']} {report['name']} ({report['city']}): {report['status']}, "
+            f"{report['written']} written, {report['skipped']} already scraped, {report['failed']} failed "
+            f"of {report['matches']} matches in {report['elapsed_s']:.1f}s ({rate:.1f} matches/min)")
+
+
+def crawl_tournament(pool, name, city, year, result_url):
+    """Scrapes the matches of one tournament not yet in the checkpoint ledger and reports progress."""
+    report = {"name": name, "city": city, "year": year, "status": "done",
+              "matches": 0, "skipped": 0, "written": 0, "failed": 0, "elapsed_s": 0.0}
+    if not result_url:
+        # Not played yet (or the archive lost the link)
+        report["status"] = "no results"
+        print(format_report(report))
+        return report
+    if is_tournament_done(name, city, year):
+        report["status"] = "skipped"
+        print(format_report(report))
+        return report
+
+    start = time.perf_counter()
+    tournament_id = get_or_create_tournament(name, city, year)
+    # Workers are idle between tournaments, so the first browser does the navigation
+    descriptors = harvest_results_page(pool.browsers[0], result_url)
+    pending = pending_descriptors(tournament_id, descriptors)
+    pool.submit(tournament_id, pending)
+    pool.join()
+    remaining = pending_descriptors(tournament_id, descriptors)
+    if not remaining:
+        complete_tournament(tournament_id, result_url, descriptors)
+
+    report.update(
+        status="done" if not remaining else "partial",
+        matches=len(descriptors),
+        skipped=len(descriptors) - len(pending),
+        written=len(pending) - len(remaining),
+        failed=len(remaining),
+        elapsed_s=time.perf_counter() - start,
+    )
+    print(format_report(report))
+    return report
+
+
+def crawl_seasons(first_year, last_year, name=None, city=None, workers=1, store=None, profile=None):
+    """Crawls every finished tournament of the given seasons through one long-lived ScraperPool.
+
+    `name` and `city` are case-insensitive substring filters.
+    """
+    player_cache.warm()
+    reports = []
+    start = time.perf_counter()
+    with ScraperPool(workers=workers, store=store, profile=profile) as pool:
+        for year in range(first_year, last_year + 1):
+            tournaments = [
+                t for t in list_tournaments(pool.browsers[0], year)
+                if t["result_url"]
+                and (name is None or name.lower() in t["name"].lower())
+                and (city is None or city.lower() in t["city"].lower())
+            ]
+            print(f"{year}: {len(tournaments)} tournaments to crawl")
+            for t in tournaments:
+                try:
+                    reports.append(crawl_tournament(pool, t["name"], t["city"], year, t["result_url"]))
+                except Exception as e:
+                    print(f"Failed to crawl {year} {t['name']}: {e}")
+
+    elapsed = time.perf_counter() - start
+    written = sum(r["written"] for r in reports)
+    print(f"Crawled {len(reports)} tournaments, {written} matches written in {elapsed:.1f}s "
+          f"({60 * written / elapsed:.1f} matches/min)")
+    print(f"Player cache: {player_cache.stats()}")
+    return reports
+
+
+def scrape_tournament_by_index(index, year=2025, workers=1, store=None, profile=None):
+    player_cache.warm()
+    with ScraperPool(workers=workers, store=store, profile=profile) as pool:
+        name, city, result_url = find_tournament(pool.browsers[0], index, year)
+        crawl_tournament(pool, name, city, year, result_url)
+
+    print(f"Player cache: {player_cache.stats()}")
+    if page_timings:
+        extract_ms = 1000 * sum(t["extract_s"] for t in page_timings) / len(page_timings)
+        print(f"Stats pages: {len(page_timings)}, mean extraction {extract_ms:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape every finished ATP tournament of a range of seasons")
+    parser.add_argument("first_year", type=int)
+    parser.add_argument("last_year", type=int, nargs="?", help="defaults to first_year")
+    parser.add_argument("--name", help="only tournaments whose name contains this")
+    parser.add_argument("--city", help="only tournaments whose city contains this")
+    parser.add_argument("--workers", type=int, default=1, help="browsers scraping stats pages in parallel")
+    parser.add_argument("--snapshots", help="also store page HTML in this snapshot directory")
+    parser.add_argument("--profile", choices=sorted(BROWSER_PROFILES),
+                        help="browser profile (defaults to BROWSER_PROFILE, else 'default')")
+    parser.add_argument("--metrics-out", default="scrape_metrics.json",
+                        help="JSON file the timing and cache metrics are written to at exit")
+    args = parser.parse_args()
+
+    instrument_sql()
+    # Written even when the crawl is interrupted
+    atexit.register(write_summary, args.metrics_out)
 
-        # except Exception as e:
-        #     print(f"Skipped match {i+1}/{match_count} due to error: {e}")
+    store = SnapshotStore(args.snapshots) if args.snapshots else None
+    crawl_seasons(args.first_year, args.last_year or args.first_year,
+                  name=args.name, city=args.city, workers=args.workers, store=store, profile=args.profile)
 
-    driver.quit()
 
 if __name__ == "__main__":
-    scrape_tournament_by_index(29)
+    main()
@@ -0,0 +1,148 @@
+import threading
+import time
+import numpy as np
+from sqlmodel import select
+from db import get_data_version, get_engine, Stats
+
+# Summed per player; features are derived from these sums
+COLUMNS = [
+    "first_serve", "first_serve_points_won", "second_serve_points_won", "break_points_saved",
+    "first_serve_return_points_won", "second_serve_return_points_won", "break_points_converted",
+    "service_points_won", "return_points_won",
+    "aces", "double_faults", "winners", "unforced_errors",
+    "service_games_played", "return_games_played",
+]
+PERCENTAGES = COLUMNS[:9]
+# (numerator, denominator columns): counts per game played are comparable across best-of-3 and best-of-5
+RATES = {
+    "aces_per_service_game": ("aces", ["service_games_played"]),
+    "double_faults_per_service_game": ("double_faults", ["service_games_played"]),
+    "winners_per_game": ("winners", ["service_games_played", "return_games_played"]),
+    "unforced_errors_per_game": ("unforced_errors", ["service_games_played", "return_games_played"]),
+}
+FEATURES = PERCENTAGES + list(RATES)
+
+# Players with fewer matches are too noisy to be offered as neighbours
+MIN_MATCHES = 3
+# Upper bound on staleness when another process writes without a shared DATA_VERSION_FILE
+REFRESH_SECONDS = 60
+
+
+class SimilarityIndex:
+    """Per-player mean stats as a NumPy matrix, updated from Stats rows newer than the last refresh."""
+
+    def __init__(self):
+        self.player_ids = np.empty(0, dtype=np.int64)
+        self.rows = {}
+        self.sums = np.zeros((0, len(COLUMNS)))
+        self.counts = np.zeros((0, len(COLUMNS)))
+        self.matches = np.zeros(0, dtype=np.int64)
+        self.last_stats_id = 0
+        self.data_version = None
+        self.refreshed_at = 0.0
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _grow(self, player_ids):
+        new_ids = [p for p in dict.fromkeys(player_ids) if p not in self.rows]
+        if not new_ids:
+            return
+        for p in new_ids:
+            self.rows[p] = len(self.rows)
+        self.player_ids = np.concatenate([self.player_ids, np.array(new_ids, dtype=np.int64)])
+        self.sums = np.vstack([self.sums, np.zeros((len(new_ids), len(COLUMNS)))])
+        self.counts = np.vstack([self.counts, np.zeros((len(new_ids), len(COLUMNS)))])
+        self.matches = np.concatenate([self.matches, np.zeros(len(new_ids), dtype=np.int64)])
+
+    def refresh(self, chunk_size=50_000):
+        # Only rows added since the last refresh are read; returns how many
+        added = 0
+        with self._lock:
+            data_version = get_data_version()
+            stmt = (select(Stats.id, Stats.player_id, *(getattr(Stats, c) for c in COLUMNS))
+                    .where(Stats.id > self.last_stats_id)
+                    .order_by(Stats.id))
+            with get_engine().connect() as conn:
+                result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+                for chunk in result.partitions(chunk_size):
+                    ids = np.array([row[0] for row in chunk], dtype=np.int64)
+                    player_ids = [row[1] for row in chunk]
+                    # None (stat missing on the page) becomes NaN and is left out of the sums
+                    values = np.array([row[2:] for row in chunk], dtype=float)
+                    self._grow(player_ids)
+                    rows = np.array([self.rows[p] for p in player_ids])
+                    valid = ~np.isnan(values)
+                    np.add.at(self.sums, rows, np.where(valid, values, 0.0))
+                    np.add.at(self.counts, rows, valid)
+                    np.add.at(self.matches, rows, 1)
+                    self.last_stats_id = int(ids.max())
+                    added += len(chunk)
+            self.data_version = data_version
+            self.refreshed_at = time.monotonic()
+            if added:
+                self._matrix = None
+        return added
+
+    def refresh_if_stale(self):
+        if self.data_version != get_data_version() or time.monotonic() - self.refreshed_at > REFRESH_SECONDS:
+            self.refresh()
+
+    def _features(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = self.sums / self.counts
+            columns = [means[:, COLUMNS.index(c)] for c in PERCENTAGES]
+            for numerator, denominators in RATES.values():
+                games = sum(self.sums[:, COLUMNS.index(c)] for c in denominators)
+                columns.append(self.sums[:, COLUMNS.index(numerator)] / games)
+        features = np.column_stack(columns)
+        # Aces with zero games played divide to inf, which would turn the whole column's std into NaN
+        features[~np.isfinite(features)] = np.nan
+        return features
+
+    def matrix(self):
+        # Standardized features, rebuilt only after a refresh added rows
+        with self._lock:
+            if self._matrix is None:
+                features = self._features()
+                eligible = self.matches >= MIN_MATCHES
+                reference = features[eligible] if eligible.any() else features
+                mean = np.nanmean(reference, axis=0) if len(reference) else np.zeros(len(FEATURES))
+                std = np.nanstd(reference, axis=0) if len(reference) else np.ones(len(FEATURES))
+                std = np.where((std > 0) & ~np.isnan(std), std, 1.0)
+                # A feature a player never recorded sits at the population mean
+                z = np.nan_to_num((features - np.nan_to_num(mean)) / std)
+                norms = np.linalg.norm(z, axis=1, keepdims=True)
+                unit = np.divide(z, norms, out=np.zeros_like(z), where=norms > 0)
+                self._matrix = (z, unit, eligible, self.player_ids, self.matches.copy())
+            return self._matrix
+
+    def nearest(self, player_id, k=10, metric="cosine"):
+        """Returns up to k (player_id, distance, matches) of the players closest to player_id."""
+        z, unit, eligible, player_ids, matches = self.matrix()
+        row = self.rows.get(player_id)
+        if row is None or row >= len(player_ids):
+            return []
+
+        if metric == "cosine":
+            distances = 1.0 - unit @ unit[row]
+        elif metric == "euclidean":
+            distances = np.sqrt(((z - z[row]) ** 2).sum(axis=1))
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+
+        candidates = np.flatnonzero(eligible & (np.arange(len(player_ids)) != row))
+        if not len(candidates):
+            return []
+        k = min(k, len(candidates))
+        # argpartition finds the k smallest in O(n); only those k are sorted
+        top = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+        top = top[np.argsort(distances[top])]
+        return [(int(player_ids[i]), float(distances[i]), int(matches[i])) for i in top]
+
+
+index = SimilarityIndex()
+
+
+def similar_players(player_id, k=10, metric="cosine"):
+    index.refresh_if_stale()
+    return index.nearest(player_id, k, metric)
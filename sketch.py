@@ -0,0 +1,57 @@
+import json
+
+# Small mergeable quantile sketch: a sorted list of [mean, weight] centroids
+MAX_CENTROIDS = 64
+
+
+def sketch_add(sketch: str, values) -> str:
+    centroids = json.loads(sketch) if sketch else []
+    centroids.extend([float(v), 1.0] for v in values)
+    centroids.sort(key=lambda c: c[0])
+
+    while len(centroids) > MAX_CENTROIDS:
+        # Merge the closest neighbouring pair, preferring light centroids so the tails stay sharp
+        i = min(
+            range(len(centroids) - 1),
+            key=lambda j: (centroids[j + 1][0] - centroids[j][0]) * (centroids[j][1] + centroids[j + 1][1]),
+        )
+        (m1, w1), (m2, w2) = centroids[i], centroids[i + 1]
+        centroids[i:i + 2] = [[(m1 * w1 + m2 * w2) / (w1 + w2), w1 + w2]]
+
+    return json.dumps(centroids)
+
+
+def sketch_from_values(values) -> str:
+    # Bulk equivalent of sketch_add("", values): equal-weight bins over the sorted values,
+    # linear in the number of values instead of merging pairs one at a time
+    values = sorted(float(v) for v in values)
+    if len(values) <= MAX_CENTROIDS:
+        return json.dumps([[v, 1.0] for v in values])
+    centroids = []
+    for i in range(MAX_CENTROIDS):
+        chunk = values[i * len(values) // MAX_CENTROIDS:(i + 1) * len(values) // MAX_CENTROIDS]
+        centroids.append([sum(chunk) / len(chunk), float(len(chunk))])
+    return json.dumps(centroids)
+
+
+def sketch_quantile(sketch: str, q: float):
+    centroids = json.loads(sketch) if sketch else []
+    if not centroids:
+        return None
+    if len(centroids) == 1:
+        return centroids[0][0]
+
+    total = sum(w for _, w in centroids)
+    target = q * total
+    cumulative = 0.0
+    previous_mid, previous_mean = None, None
+    for mean, weight in centroids:
+        mid = cumulative + weight / 2
+        if target <= mid:
+            if previous_mid is None:
+                return mean
+            fraction = (target - previous_mid) / (mid - previous_mid)
+            return previous_mean + fraction * (mean - previous_mean)
+        previous_mid, previous_mean = mid, mean
+        cumulative += weight
+    return centroids[-1][0]
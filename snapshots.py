@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import os
+import sys
+import tempfile
+from db import insert_match_bundle, pending_descriptors, player_cache
+from parsing import match_from_descriptor, parse_results_html, parse_stats_html
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class SnapshotStore:
+    """Gzipped page HTML stored by content hash, with a URL -> content hash index."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.html.gz")
+
+    def _ref_path(self, url):
+        digest = _sha256(url.encode())
+        return os.path.join(self.root, "urls", digest[:2], digest)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A unique temporary file per write: ScraperPool threads may store the same object at once
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+
+    def put(self, url, page_html):
+        data = page_html.encode()
+        digest = _sha256(data)
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            self._write(object_path, gzip.compress(data))
+        self._write(self._ref_path(url), digest.encode())
+        return digest
+
+    def has(self, url):
+        return os.path.exists(self._ref_path(url))
+
+    def get(self, url):
+        try:
+            with open(self._ref_path(url), "rb") as f:
+                digest = f.read().decode()
+        except FileNotFoundError:
+            return None
+        with gzip.open(self._object_path(digest), "rb") as f:
+            return f.read().decode()
+
+
+def reparse_tournament(store, result_url):
+    page_html = store.get(result_url)
+    if page_html is None:
+        raise KeyError(f"No snapshot for {result_url}")
+
+    parsed = []
+    for descriptor in parse_results_html(page_html, result_url):
+        stats_html = store.get(descriptor["stats_url"])
+        if stats_html is None:
+            print(f"No snapshot for {descriptor['stats_url']}")
+            continue
+        parsed.append((descriptor, parse_stats_html(stats_html)))
+    return parsed
+
+
+def reingest_tournament(store, result_url, tournament_id):
+    # Only matches missing from the checkpoint ledger, so rerunning never duplicates rows
+    parsed = reparse_tournament(store, result_url)
+    pending = {d["stats_url"] for d in pending_descriptors(tournament_id, [d for d, _ in parsed])}
+    matches = [match_from_descriptor(d, stats, player_cache.get_or_create)
+               for d, stats in parsed if d["stats_url"] in pending]
+    if not matches:
+        print(f"Nothing to reingest: all {len(parsed)} matches of {result_url} are already stored")
+        return tournament_id, []
+    return insert_match_bundle(tournament_id, matches)
+
+
+if __name__ == "__main__":
+    # python snapshots.py <snapshot_dir> <result_url> <tournament_id>
+    reingest_tournament(SnapshotStore(sys.argv[1]), sys.argv[2], int(sys.argv[3]))
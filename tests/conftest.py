@@ -0,0 +1,145 @@
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Empty values win over a developer's .env, which must not point the tests at another database
+for _name in ("DB_PROFILE", "REPLICA_PATH", "DATA_VERSION_FILE"):
+    os.environ[_name] = ""
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# bench.synth sizes; "large" has several times the rows of "small" in every table
+SYNTHETIC_SIZES = {
+    "small": {"seasons": 1, "tournaments_per_season": 2, "matches_per_tournament": 8, "players": 20},
+    "large": {"seasons": 2, "tournaments_per_season": 6, "matches_per_tournament": 48, "players": 100},
+}
+
+# utils query functions and how to call them with (tournament_id, player_id, match_id)
+QUERY_CASES = {
+    "list_tournaments": lambda t, p, m: (),
+    "list_players": lambda t, p, m: (),
+    "search_players": lambda t, p, m: ("Player 0",),
+    "search_tournaments": lambda t, p, m: ("Open",),
+    "list_matches_for_tournament": lambda t, p, m: (t,),
+    "get_match_stats": lambda t, p, m: (m,),
+    "get_player_stats_across_matches": lambda t, p, m: (p, t),
+    "get_players_in_tournament": lambda t, p, m: (t,),
+    "get_player_stat_values": lambda t, p, m: (p, "aces"),
+    "get_player_name": lambda t, p, m: (p,),
+    "get_tournament_name": lambda t, p, m: (t,),
+    "get_tournament_label": lambda t, p, m: (t,),
+    "get_player_stat_matrix": lambda t, p, m: (p, ["service_points_won", "return_points_won"]),
+    "get_player_stat_summary": lambda t, p, m: (p, "aces"),
+    "get_player_form": lambda t, p, m: (p, "aces"),
+}
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def query_functions():
+    # utils functions wrapped by cache.cached (sqlalchemy's `func` answers any attribute, hence the module check)
+    import utils
+
+    return {
+        name: value for name, value in vars(utils).items()
+        if getattr(value, "__module__", None) == "utils" and hasattr(value, "cache_clear")
+    }
+
+
+def clear_caches():
+    for func in query_functions().values():
+        func.cache_clear()
+
+
+class FakeBrowser:
+    """Serves page HTML from a dict instead of driving Chrome."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.driver = self
+        self.page_source = None
+
+    def throttle(self):
+        pass
+
+    def rest(self):
+        pass
+
+    def load(self, url, selector):
+        self.page_source = self.pages[url]
+
+    def snapshot(self, url):
+        pass
+
+
+@contextmanager
+def use_database(url):
+    """Points db.get_engine() at `url` for the duration of the block."""
+    import db
+
+    previous = os.environ.get("DATABASE_URL")
+    os.environ["DATABASE_URL"] = url
+    db.dispose_engines()
+    clear_caches()
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop("DATABASE_URL", None)
+        else:
+            os.environ["DATABASE_URL"] = previous
+        db.dispose_engines()
+        clear_caches()
+
+
+@pytest.fixture(scope="session")
+def synthetic_databases(tmp_path_factory):
+    # SQLite files filled by bench.synth, by size name
+    from bench.synth import generate
+
+    urls = {}
+    for size, params in SYNTHETIC_SIZES.items():
+        url = f"sqlite:///{tmp_path_factory.mktemp(size) / 'synth.db'}"
+        with use_database(url):
+            generate(**params)
+        urls[size] = url
+    return urls
+
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    # An empty, migrated SQLite file
+    import db
+
+    with use_database(f"sqlite:///{tmp_path / 'test.db'}"):
+        db.create_db()
+        yield
+
+
+NUMERIC_AGGREGATES = ["count", "total", "total_sq", "min_value", "max_value"]
+
+
+def aggregate_tables(engine=None):
+    # {table name: {primary key: row}} for both aggregate tables, of the main database by default
+    from sqlalchemy import select
+    from sqlmodel import Session
+    from db import PlayerStatAggregate, PlayerTournamentStatAggregate, get_engine
+
+    tables = {}
+    with Session(engine if engine is not None else get_engine("scraper")) as session:
+        for model in (PlayerStatAggregate, PlayerTournamentStatAggregate):
+            table = model.__table__
+            keys = [c.name for c in table.primary_key]
+            tables[table.name] = {
+                tuple(row[k] for k in keys): dict(row)
+                for row in session.connection().execute(select(table)).mappings()
+            }
+    return tables
@@ -0,0 +1,36 @@
+import json
+import random
+import pytest
+from conftest import NUMERIC_AGGREGATES, aggregate_tables
+from bench.synth import random_stats
+from db import insert_match_bundle, rebuild_aggregates, upsert_player
+
+
+def insert_batches(rng, player_ids, batches, matches_per_batch):
+    for n in range(batches):
+        matches = []
+        for _ in range(matches_per_batch):
+            p1, p2 = rng.sample(player_ids, 2)
+            matches.append({"player1_id": p1, "player2_id": p2, "winner_id": p1,
+                            "stats": {"Player 1": random_stats(rng), "Player 2": random_stats(rng)}})
+        # Two tournaments, so later batches update existing rows in both tables
+        insert_match_bundle(("Aggregate Open", f"City {n % 2}", 2025), matches)
+
+
+def test_incremental_aggregates_match_rebuild(sqlite_db):
+    rng = random.Random(1)
+    player_ids = [upsert_player(f"Aggregate Player {i}") for i in range(4)]
+    insert_batches(rng, player_ids, batches=6, matches_per_batch=20)
+    incremental = aggregate_tables()
+
+    rebuild_aggregates()
+    rebuilt = aggregate_tables()
+
+    assert incremental.keys() == rebuilt.keys()
+    for name, rows in rebuilt.items():
+        assert incremental[name].keys() == rows.keys()
+        for key, row in rows.items():
+            merged = incremental[name][key]
+            assert {c: merged[c] for c in NUMERIC_AGGREGATES} == pytest.approx({c: row[c] for c in NUMERIC_AGGREGATES}), (name, key)
+            # Every value landed in the sketch, including those merged into existing rows
+            assert sum(weight for _, weight in json.loads(merged["sketch"])) == merged["count"]
@@ -0,0 +1,21 @@
+import numpy as np
+from cache import cached
+
+
+def test_cached_values_are_not_shared_with_callers():
+    calls = []
+
+    @cached()
+    def matrix(player_id):
+        calls.append(player_id)
+        return {"aces": np.array([1.0, 2.0, 3.0]), "rows": [1, 2, 3]}
+
+    first = matrix(1)
+    first["aces"] *= 10
+    first["rows"].append(4)
+    matrix(1)["aces"][0] = -1
+
+    again = matrix(1)
+    assert calls == [1]
+    assert again["aces"].tolist() == [1.0, 2.0, 3.0]
+    assert again["rows"] == [1, 2, 3]
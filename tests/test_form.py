@@ -0,0 +1,73 @@
+import random
+from datetime import date
+import pytest
+import columnar
+import utils
+from bench.synth import random_stats
+from db import insert_match_bundle, upsert_player
+
+# (year, round, played_on, won, aces) in insertion order, so match ids do not follow time
+MATCHES = [
+    (2025, "Semifinals", None, False, 8),
+    (2025, "Round of 32", None, True, 2),
+    (2025, "Final", None, True, 10),
+    (2024, "Final", date(2024, 1, 14), False, 6),
+    (2024, "Round of 16", date(2024, 1, 10), True, 4),
+    (2025, "Round Robin", None, True, 1),
+    (2025, "Round Robin", None, True, 3),
+]
+# Dated 2024 matches by date, then the undated 2025 ones by round rank, the two Round Robins by id
+CHRONOLOGICAL = [4, 3, 5, 6, 1, 0, 2]
+
+
+@pytest.fixture
+def form_matches(sqlite_db):
+    rng = random.Random(3)
+    player_id = upsert_player("Form Player")
+    opponent_id = upsert_player("Form Opponent")
+    tournament_ids, match_ids = {}, []
+    for year, round_label, played_on, won, aces in MATCHES:
+        stats = {"Player 1": {**random_stats(rng), "aces": aces}, "Player 2": random_stats(rng)}
+        tournament_ids[year], ids = insert_match_bundle(("Form Open", "City", year), [{
+            "player1_id": player_id, "player2_id": opponent_id,
+            "winner_id": player_id if won else opponent_id,
+            "round": round_label, "played_on": played_on, "stats": stats,
+        }])
+        match_ids.extend(ids)
+    return player_id, tournament_ids, match_ids
+
+
+def test_player_form_follows_season_date_and_round(form_matches):
+    player_id, _, match_ids = form_matches
+    alpha, window = 0.5, 3
+    df = utils.get_player_form(player_id, "aces", window=window, alpha=alpha)
+
+    assert df["match_id"].tolist() == [match_ids[i] for i in CHRONOLOGICAL]
+    values = [MATCHES[i][4] for i in CHRONOLOGICAL]
+    assert df["value"].tolist() == values
+    assert df["rolling_mean"].tolist() == pytest.approx(
+        [sum(values[max(0, n - window + 1):n + 1]) / len(values[max(0, n - window + 1):n + 1])
+         for n in range(len(values))])
+    # W L W W W L W
+    assert df["streak"].tolist() == [1, -1, 1, 2, 3, -1, 1]
+    weights = [[(1 - alpha) ** (n - i) for i in range(n + 1)] for n in range(len(values))]
+    assert df["ewma"].tolist() == pytest.approx(
+        [sum(w * v for w, v in zip(ws, values)) / sum(ws) for ws in weights])
+
+
+def test_stats_readers_agree_on_order(form_matches, tmp_path):
+    player_id, tournament_ids, match_ids = form_matches
+    columnar.export_stats(str(tmp_path / "snapshot"))
+    # Latest first: Final, Semifinals, Round of 32, then the Round Robins by descending id
+    expected = [match_ids[i] for i in (2, 0, 1, 6, 5)]
+
+    df = utils.get_player_stats_across_matches(player_id, tournament_ids[2025])
+    assert df["match_id"].tolist() == expected
+    assert df["round"].tolist() == ["Final", "Semifinals", "Round of 32", "Round Robin", "Round Robin"]
+    parquet = columnar.get_player_stats_across_matches(str(tmp_path / "snapshot"), player_id, tournament_ids[2025])
+    assert parquet["match_id"].tolist() == expected
+
+    dated = utils.get_player_stats_across_matches(player_id, tournament_ids[2024])
+    assert dated["match_id"].tolist() == [match_ids[3], match_ids[4]]
+    assert columnar.get_player_stats_across_matches(
+        str(tmp_path / "snapshot"), player_id, tournament_ids[2024])["match_id"].tolist() == [match_ids[3], match_ids[4]]
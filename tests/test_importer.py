@@ -0,0 +1,90 @@
+import csv
+import pytest
+from sqlmodel import Session, func, select
+from conftest import NUMERIC_AGGREGATES, aggregate_tables
+import importer
+from db import Match, get_engine, rebuild_aggregates
+from importer import import_files
+
+FIELDS = ["tournament", "city", "year", "player1", "player2", "winner", "round", "p1_aces", "p2_aces",
+          "p1_service_games_played", "p2_service_games_played"]
+RECORDS = [
+    ["Import Open", "City", "2024", "Ann", "Bea", "Ann", "Semifinals", "5", "2", "10", "10"],
+    ["Import Open", "City", "2024", "Cat", "Dee", "Dee", "Semifinals", "1", "7", "12", "12"],
+    ["Import Open", "City", "2024", "Ann", "Dee", "Dee", "Final", "3", "9", "11", "11"],
+    # Too large for an INTEGER column: fails when the tournament is created
+    ["Broken Open", "City", "99999999999999999999", "Ann", "Bea", "Ann", "Final", "1", "1", "8", "8"],
+    ["Import Open", "City", "2025", "Bea", "Cat", "Bea", "Final", "4", "4", "9", "9"],
+]
+
+
+def write_csv(path, records):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        writer.writerows(records)
+    return str(path)
+
+
+@pytest.fixture
+def matches_csv(tmp_path):
+    return write_csv(tmp_path / "matches.csv", RECORDS)
+
+
+def match_count():
+    with Session(get_engine("scraper")) as session:
+        return session.exec(select(func.count()).select_from(Match)).one()
+
+
+def test_bad_tournament_is_rejected_and_reimport_is_a_noop(sqlite_db, matches_csv, capsys):
+    assert import_files([matches_csv]) == 4
+    assert "rejected 1 records" in capsys.readouterr().out
+
+    assert import_files([matches_csv]) == 0
+    assert "skipped 4 already imported" in capsys.readouterr().out
+    assert match_count() == 4
+
+
+def test_import_updates_aggregates_incrementally(sqlite_db, matches_csv):
+    import_files([matches_csv])
+    imported = aggregate_tables()
+    assert imported["playerstataggregate"]
+
+    rebuild_aggregates()
+    rebuilt = aggregate_tables()
+    assert imported.keys() == rebuilt.keys()
+    for name, rows in rebuilt.items():
+        assert imported[name].keys() == rows.keys()
+        for key, row in rows.items():
+            assert ({c: imported[name][key][c] for c in NUMERIC_AGGREGATES}
+                    == pytest.approx({c: row[c] for c in NUMERIC_AGGREGATES})), (name, key)
+
+
+def test_roundless_rematch_is_rejected(sqlite_db, tmp_path, capsys):
+    path = write_csv(tmp_path / "rematch.csv", [
+        ["Rematch Open", "City", "2024", "Ann", "Bea", "Ann", "", "5", "2", "10", "10"],
+        ["Rematch Open", "City", "2024", "Bea", "Ann", "Bea", "", "3", "4", "10", "10"],
+    ])
+    assert import_files([path]) == 1
+    assert "rejected 1 records" in capsys.readouterr().out
+
+
+def test_match_keys_are_dropped_once_written(sqlite_db, tmp_path, monkeypatch):
+    held = []
+
+    class TrackedMatches(importer.ExistingMatches):
+        def add(self, tournament_id, match):
+            held.append(len(self.keys))
+            return super().add(tournament_id, match)
+
+    monkeypatch.setattr(importer, "ExistingMatches", TrackedMatches)
+    path = write_csv(tmp_path / "seasons.csv", [
+        [f"Season Open {year}", "City", str(year), f"Player {n}", f"Player {n + 1}", f"Player {n}", "Round of 16",
+         "1", "1", "8", "8"]
+        for year in range(2000, 2020) for n in range(4)
+    ])
+
+    assert import_files([path], batch_size=2) == 80
+    assert import_files([path], batch_size=2) == 0
+    # One key set at a time, however many tournaments the file holds
+    assert max(held) <= 1
@@ -0,0 +1,47 @@
+import random
+import pytest
+from sqlalchemy import insert, select, text
+from conftest import NUMERIC_AGGREGATES, aggregate_tables
+from bench.synth import random_stats
+from db import Player, Stats, Tournament, get_engine, insert_match_bundle, rebuild_aggregates
+from migrations import migrate
+
+
+def test_dedupe_migrations_rebuild_aggregates(sqlite_db):
+    rng = random.Random(2)
+    engine = get_engine("scraper")
+    # A database from before migrations 1 and 4: duplicate names were allowed
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_player_name"))
+        conn.execute(text("DROP INDEX ux_tournament_name_city_year"))
+        conn.execute(text("DELETE FROM schema_migration WHERE version IN (1, 4)"))
+        player_ids = [conn.execute(insert(Player.__table__).values(name=name)).inserted_primary_key[0]
+                      for name in ("Duplicate", "Duplicate", "Opponent", "Opponent")]
+        tournament_ids = [conn.execute(insert(Tournament.__table__).values(name="Open", city="City", year=2025))
+                          .inserted_primary_key[0] for _ in range(2)]
+
+    for tournament_id, (player_id, opponent_id) in zip(tournament_ids, [player_ids[:3:2], player_ids[1::2]]):
+        insert_match_bundle(tournament_id, [
+            {"player1_id": player_id, "player2_id": opponent_id, "winner_id": player_id,
+             "stats": {"Player 1": random_stats(rng), "Player 2": random_stats(rng)}}
+            for _ in range(5)
+        ])
+
+    migrate()
+
+    with engine.connect() as conn:
+        assert conn.execute(select(Player.name).order_by(Player.name)).scalars().all() == ["Duplicate", "Opponent"]
+        assert len(conn.execute(select(Tournament.id)).all()) == 1
+        stats_rows = conn.execute(select(Stats.player_id)).scalars().all()
+    migrated = aggregate_tables()
+    rebuild_aggregates()
+    rebuilt = aggregate_tables()
+
+    assert migrated.keys() == rebuilt.keys()
+    for name, rows in rebuilt.items():
+        assert migrated[name].keys() == rows.keys()
+        for key, row in rows.items():
+            assert ({c: migrated[name][key][c] for c in NUMERIC_AGGREGATES}
+                    == pytest.approx({c: row[c] for c in NUMERIC_AGGREGATES})), (name, key)
+    # Both duplicates' matches now count towards the kept player
+    assert migrated["playerstataggregate"][(player_ids[0], "aces")]["count"] == stats_rows.count(player_ids[0]) == 10
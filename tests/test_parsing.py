@@ -0,0 +1,100 @@
+from datetime import date
+import pytest
+from conftest import read_fixture
+from parsing import (match_from_descriptor, parse_archive_html, parse_match_date, parse_results_html,
+                     parse_stat_rows, parse_stats_html, process_stat_value)
+
+RESULT_URL = "https://www.atptour.com/en/scores/archive/australian-open/580/2025/results"
+ARCHIVE_URL = "https://www.atptour.com/en/scores/results-archive?year=2025"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("12", 12),
+    (" 7 ", 7),
+    ("38/49 (78%)", 0.78),
+    ("0/3 (0%)", 0.0),
+    ("3/4 (75 %)", 0.75),
+])
+def test_process_stat_value(text, expected):
+    assert process_stat_value(text) == expected
+
+
+def test_parse_stat_rows_skips_bad_rows():
+    stats = parse_stat_rows([
+        ("Aces", "5", "9"),
+        ("2nd Serve Points Won", "10/20 (50%)", "9/18 (50%)"),
+        ("Winners", "n/a", "12"),
+    ])
+    assert stats == {
+        "Player 1": {"aces": 5, "2nd_serve_points_won": 0.5},
+        "Player 2": {"aces": 9, "2nd_serve_points_won": 0.5},
+    }
+
+
+def test_parse_stats_html():
+    stats = parse_stats_html(read_fixture("stats.html"))
+    assert stats == {
+        "Player 1": {"serve_rating": 289, "aces": 12, "1st_serve_points_won": 0.78, "break_points_saved": 0.75},
+        "Player 2": {"serve_rating": 241, "aces": 4, "1st_serve_points_won": 0.64, "break_points_saved": 0.0},
+    }
+
+
+def test_parse_results_html():
+    descriptors = parse_results_html(read_fixture("results.html"), RESULT_URL)
+    # The walkover has no stats link and is left out
+    assert descriptors == [
+        {
+            "stats_url": "https://www.atptour.com/en/scores/match-stats/archive/2025/580/ms001",
+            "player1": "Jannik Sinner",
+            "player2": "Alexander Zverev",
+            "winner": "Jannik Sinner",
+            "round": "Final",
+            "played_on": date(2025, 1, 26),
+        },
+        {
+            "stats_url": "https://www.atptour.com/en/scores/match-stats/archive/2025/580/ms002",
+            "player1": "Ben Shelton",
+            "player2": "Jannik Sinner",
+            "winner": "Jannik Sinner",
+            "round": "Semifinals",
+            "played_on": date(2025, 1, 24),
+        },
+    ]
+
+
+def test_parse_archive_html():
+    tournaments = parse_archive_html(read_fixture("archive.html"), ARCHIVE_URL)
+    # The promo entry is left out, but still counts towards the index
+    assert [(t["index"], t["name"], t["city"], t["result_url"]) for t in tournaments] == [
+        (0, "Brisbane International", "Brisbane, Australia",
+         "https://www.atptour.com/en/scores/archive/brisbane/339/2025/results"),
+        (2, "Australian Open", "Melbourne, Australia",
+         "https://www.atptour.com/en/scores/archive/australian-open/580/2025/results"),
+        (3, "Nitto ATP Finals", "Turin, Italy", None),
+    ]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Sun, 26 January, 2025 Day (15)", date(2025, 1, 26)),
+    ("Mon, 3 March 2025", date(2025, 3, 3)),
+    ("Day (15)", None),
+    ("Sun, 31 February, 2025", None),
+])
+def test_parse_match_date(text, expected):
+    assert parse_match_date(text) == expected
+
+
+def test_match_from_descriptor():
+    descriptor = parse_results_html(read_fixture("results.html"), RESULT_URL)[1]
+    ids = {"Ben Shelton": 1, "Jannik Sinner": 2}
+    stats = parse_stats_html(read_fixture("stats.html"))
+    match = match_from_descriptor(descriptor, stats, ids.__getitem__)
+    assert match == {
+        "player1_id": 1,
+        "player2_id": 2,
+        "winner_id": 2,
+        "stats": stats,
+        "stats_url": descriptor["stats_url"],
+        "round": "Semifinals",
+        "played_on": date(2025, 1, 24),
+    }
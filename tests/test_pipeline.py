@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from sqlmodel import Session, select
+from conftest import FakeBrowser, read_fixture
+import pipeline
+from db import ScrapeCheckpoint, get_engine, get_or_create_tournament
+
+STATS_HTML = read_fixture("stats.html")
+
+
+def descriptors(n):
+    return [{"stats_url": f"https://example.test/stats/{i}", "player1": f"Player {2 * i}",
+             "player2": f"Player {2 * i + 1}", "winner": f"Player {2 * i}"} for i in range(n)]
+
+
+def run(browsers, tournament_id, matches):
+    # Small queues, so a dead stage would block the others; the timeout turns a hang into a failure
+    bucket = pipeline.TokenBucket(rate=1000, capacity=1000)
+    return asyncio.run(asyncio.wait_for(
+        pipeline.run_pipeline(browsers, tournament_id, matches, bucket, batch_size=2, queue_size=1),
+        timeout=30,
+    ))
+
+
+def checkpoints():
+    with Session(get_engine("scraper")) as session:
+        return {c.url: c.status for c in session.exec(select(ScrapeCheckpoint))}
+
+
+def test_unparsable_page_is_recorded_and_skipped(sqlite_db):
+    tournament_id = get_or_create_tournament("Pipeline Open", "City", 2025)
+    matches = descriptors(8)
+    pages = {d["stats_url"]: STATS_HTML for d in matches}
+    # lxml refuses an empty document
+    pages[matches[3]["stats_url"]] = ""
+
+    written = run([FakeBrowser(pages), FakeBrowser(pages)], tournament_id, matches)
+
+    assert written == 7
+    status = checkpoints()
+    assert status.pop(matches[3]["stats_url"]) == "failed"
+    assert set(status.values()) == {"done"} and len(status) == 7
+
+
+def test_stage_failure_is_raised_instead_of_hanging(sqlite_db, monkeypatch):
+    tournament_id = get_or_create_tournament("Pipeline Open", "City", 2025)
+    matches = descriptors(8)
+    pages = {d["stats_url"]: STATS_HTML for d in matches}
+
+    def broken_write_batch(tournament_id, batch):
+        raise RuntimeError("writer crashed")
+
+    monkeypatch.setattr(pipeline, "_write_batch", broken_write_batch)
+    with pytest.raises(RuntimeError, match="writer crashed"):
+        run([FakeBrowser(pages)], tournament_id, matches)
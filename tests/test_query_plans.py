@@ -0,0 +1,56 @@
+import os
+import pytest
+from sqlmodel import SQLModel
+from sqlalchemy import text
+from conftest import QUERY_CASES, SYNTHETIC_SIZES, clear_caches, use_database
+import utils
+from bench.explain import capture_statements, seq_scans
+from bench.run import pick_arguments
+from db import get_engine
+
+# A scratch PostgreSQL database; every table in it is dropped and refilled
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture(scope="session")
+def postgres_database():
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    from bench.synth import generate
+
+    with use_database(POSTGRES_URL):
+        engine = get_engine("scraper")
+        SQLModel.metadata.drop_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS schema_migration"))
+        generate(**SYNTHETIC_SIZES["large"])
+    return POSTGRES_URL
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def planned_database(request, synthetic_databases):
+    if request.param == "postgresql":
+        return request.getfixturevalue("postgres_database")
+    return synthetic_databases["large"]
+
+
+@pytest.mark.parametrize("name", sorted(QUERY_CASES))
+def test_queries_use_indexes(planned_database, name):
+    with use_database(planned_database):
+        # Planner statistics are stale right after a synthetic bulk load
+        with get_engine("scraper").begin() as conn:
+            conn.execute(text("ANALYZE"))
+        args = QUERY_CASES[name](*pick_arguments())
+        clear_caches()
+        statements = capture_statements(getattr(utils, name), args)
+        assert statements
+
+        scans = []
+        with get_engine("scraper").connect() as conn:
+            if conn.dialect.name == "postgresql":
+                # The test data is small enough for a sequential scan to win on cost; with seq scans
+                # discouraged, one still chosen means no index can serve the query
+                conn.execute(text("SET enable_seqscan = off"))
+            for statement, parameters in statements:
+                scans.extend(seq_scans(conn, statement, parameters))
+    assert scans == []
@@ -0,0 +1,72 @@
+import random
+import pytest
+from sqlalchemy import create_engine, insert, select
+from conftest import NUMERIC_AGGREGATES, aggregate_tables
+from bench.synth import random_stats
+from db import Match, Stats, get_engine, insert_match_bundle, rebuild_aggregates, stats_values, upsert_player
+from replica import sync
+
+
+def insert_matches(rng, player_ids, n):
+    matches = []
+    for _ in range(n):
+        p1, p2 = rng.sample(player_ids, 2)
+        matches.append({"player1_id": p1, "player2_id": p2, "winner_id": p1,
+                        "stats": {"Player 1": random_stats(rng), "Player 2": random_stats(rng)}})
+    insert_match_bundle(("Replica Open", "City", 2025), matches)
+
+
+def insert_match_with_stats_ids(rng, player_ids, stats_ids):
+    # As if a slow writer committed these ids after higher ones were already visible
+    p1, p2 = player_ids[:2]
+    with get_engine("scraper").begin() as conn:
+        tournament_id = conn.execute(select(Match.tournament_id)).scalars().first()
+        match_id = conn.execute(insert(Match.__table__).values(
+            tournament_id=tournament_id, player1_id=p1, player2_id=p2, winner_id=p1)).inserted_primary_key[0]
+        conn.execute(insert(Stats.__table__), [
+            {**stats_values(match_id, player_id, random_stats(rng)), "id": stats_id}
+            for player_id, stats_id in zip((p1, p2), stats_ids)
+        ])
+
+
+def stats_ids(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(Stats.id)).scalars())
+
+
+def assert_same_aggregates(replica, main):
+    assert replica.keys() == main.keys()
+    for name, rows in main.items():
+        assert replica[name].keys() == rows.keys()
+        for key, row in rows.items():
+            assert ({c: replica[name][key][c] for c in NUMERIC_AGGREGATES}
+                    == pytest.approx({c: row[c] for c in NUMERIC_AGGREGATES})), (name, key)
+
+
+def test_sync_copies_then_appends(sqlite_db, tmp_path):
+    rng = random.Random(4)
+    path = str(tmp_path / "replica.db")
+    replica = create_engine(f"sqlite:///{path}")
+    player_ids = [upsert_player(f"Replica Player {i}") for i in range(4)]
+
+    # Stats ids 1-8, then 20-21 with a gap below them
+    insert_matches(rng, player_ids, 4)
+    insert_match_with_stats_ids(rng, player_ids, (20, 21))
+    rebuild_aggregates()
+
+    copied = sync(path)
+    assert copied["stats"] == 10
+    assert_same_aggregates(aggregate_tables(replica), aggregate_tables())
+
+    # Two ids below the replica's maximum, then new ones above it
+    insert_match_with_stats_ids(rng, player_ids, (9, 10))
+    insert_matches(rng, player_ids, 2)
+    copied = sync(path)
+    assert copied["stats"] == 6 and copied["match"] == 3
+    assert sync(path) == {"tournament": 0, "player": 0, "match": 0, "stats": 0}
+
+    assert stats_ids(replica) == stats_ids(get_engine("scraper"))
+    # Merged through update_aggregates on the replica; recomputed from scratch on the main database
+    rebuild_aggregates()
+    assert_same_aggregates(aggregate_tables(replica), aggregate_tables())
+    replica.dispose()
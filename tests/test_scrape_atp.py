@@ -0,0 +1,111 @@
+import pytest
+from lxml import html as lxml_html
+from conftest import FakeBrowser, read_fixture
+import scrape_atp
+from parsing import _has_class, parse_stats_html
+
+RESULTS_URL = "https://www.atptour.com/en/scores/archive/australian-open/580/2025/results"
+
+
+@pytest.fixture
+def archive_browser():
+    return FakeBrowser({scrape_atp.ARCHIVE_URL.format(year=2025): read_fixture("archive.html")})
+
+
+def test_find_tournament_counts_skipped_entries(archive_browser):
+    # Position 1 is the promo entry, which list_tournaments leaves out
+    assert scrape_atp.find_tournament(archive_browser, 2, 2025) == (
+        "Australian Open", "Melbourne, Australia",
+        "https://www.atptour.com/en/scores/archive/australian-open/580/2025/results",
+    )
+    with pytest.raises(IndexError):
+        scrape_atp.find_tournament(archive_browser, 1, 2025)
+
+
+def test_tournament_without_results_is_reported(archive_browser):
+    name, city, result_url = scrape_atp.find_tournament(archive_browser, 3, 2025)
+    assert result_url is None
+    # Returns before the pool is touched
+    report = scrape_atp.crawl_tournament(None, name, city, 2025, result_url)
+    assert report["status"] == "no results"
+    assert scrape_atp.format_report(report) == "2025 Nitto ATP Finals (Turin, Italy): no results page yet"
+
+
+class FakeChrome:
+    """Stands in for uc.Chrome: serves fixture HTML and logs what the scraper asks of Chrome."""
+
+    def __init__(self, pages, log, options=None, headless=None):
+        self.pages = pages
+        self.log = log
+        self.page_source = None
+        log.append(("start", options.page_load_strategy, headless))
+
+    def execute_cdp_cmd(self, command, params):
+        self.log.append(("cdp", command, params))
+
+    def get(self, url):
+        self.page_source = self.pages[url]
+        self.log.append(("get", url))
+
+    def find_elements(self, by, selector):
+        # Only the "tag.class > tag" selectors the scraper waits for
+        steps = []
+        for part in selector.split(" > "):
+            tag, _, cls = part.partition(".")
+            steps.append(f"{tag}[{_has_class(cls)}]" if cls else tag)
+        return lxml_html.fromstring(self.page_source).xpath("//" + "/".join(steps))
+
+    def quit(self):
+        self.log.append(("quit",))
+
+
+@pytest.fixture
+def chrome(monkeypatch):
+    pages = {scrape_atp.ARCHIVE_URL.format(year=2025): read_fixture("archive.html"),
+             RESULTS_URL: read_fixture("results.html")}
+    pages.update({f"https://example.test/stats/{n}": read_fixture("stats.html") for n in range(5)})
+    log = []
+    monkeypatch.setattr(scrape_atp.uc, "Chrome", lambda **kwargs: FakeChrome(pages, log, **kwargs))
+    monkeypatch.setattr(scrape_atp.time, "sleep", lambda seconds: log.append(("sleep", seconds)))
+    return log
+
+
+def test_lean_profile_blocks_requests_and_recycles_driver(chrome):
+    browser = scrape_atp.Browser(delay=(0, 0), profile="lean")
+    browser.profile = {**browser.profile, "recycle_after": 2}
+    for n in range(5):
+        html = scrape_atp.fetch_stats_html(browser, f"https://example.test/stats/{n}")
+        assert parse_stats_html(html) == parse_stats_html(read_fixture("stats.html"))
+
+    # Restarted before the 3rd and 5th page, every driver blocking the same requests
+    starts = [i for i, event in enumerate(chrome) if event[0] == "start"]
+    assert len(starts) == 3
+    assert [event[0] for event in chrome].count("quit") == 2
+    for i in starts:
+        assert chrome[i] == ("start", "eager", True)
+        assert chrome[i + 1:i + 3] == [("cdp", "Network.enable", {}),
+                                       ("cdp", "Network.setBlockedURLs", {"urls": scrape_atp.BLOCKED_URLS})]
+
+
+def test_default_profile_sleeps_after_every_load(chrome):
+    browser = scrape_atp.Browser(delay=(2, 4))
+    descriptors = scrape_atp.harvest_results_page(browser, RESULTS_URL)
+    assert [d["round"] for d in descriptors] == ["Final", "Semifinals"]
+    scrape_atp.list_tournaments(browser, 2025)
+
+    assert chrome[0] == ("start", "normal", False)
+    assert not [event for event in chrome if event[0] in ("cdp", "quit")]
+    events = [event[0] for event in chrome[1:]]
+    assert events == ["get", "sleep", "get", "sleep"]
+    assert all(2 <= event[1] <= 4 for event in chrome if event[0] == "sleep")
+
+
+def test_lean_profile_spaces_load_starts(chrome):
+    browser = scrape_atp.Browser(delay=(2, 2), profile="lean")
+    scrape_atp.harvest_results_page(browser, RESULTS_URL)
+    scrape_atp.list_tournaments(browser, 2025)
+
+    # Nothing to wait for before the first load, and no sleep after either
+    events = [event[0] for event in chrome if event[0] in ("get", "sleep")]
+    assert events == ["get", "sleep", "get"]
+    assert 0 < next(event[1] for event in chrome if event[0] == "sleep") <= 2
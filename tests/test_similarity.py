@@ -0,0 +1,28 @@
+import numpy as np
+from similarity import COLUMNS, FEATURES, SimilarityIndex
+
+
+def build_index(rng, players=6):
+    index = SimilarityIndex()
+    index._grow(list(range(1, players + 1)))
+    index.sums = rng.uniform(1, 50, size=(players, len(COLUMNS)))
+    index.counts = np.full((players, len(COLUMNS)), 5.0)
+    index.matches[:] = 5
+    return index
+
+
+def test_rate_without_games_does_not_poison_the_matrix():
+    index = build_index(np.random.default_rng(0))
+    # Aces recorded, but the games-played tiles were missing on every page
+    index.sums[0, COLUMNS.index("service_games_played")] = 0.0
+
+    z, unit, eligible, player_ids, matches = index.matrix()
+
+    aces = FEATURES.index("aces_per_service_game")
+    # The undefined rate sits at the mean; everyone else is standardized as usual
+    assert z[0, aces] == 0.0
+    assert np.abs(z).max() < 10
+    assert np.isclose(np.std(z[1:, aces]), 1.0)
+    neighbours = index.nearest(2, k=5)
+    assert len(neighbours) == 5
+    assert all(np.isfinite(distance) for _, distance, _ in neighbours)
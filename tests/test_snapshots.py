@@ -0,0 +1,59 @@
+import threading
+from sqlmodel import Session, func, select
+from conftest import read_fixture
+from db import Match, ScrapeCheckpoint, Stats, get_engine, get_or_create_tournament
+from parsing import parse_results_html
+from snapshots import SnapshotStore, reingest_tournament
+
+RESULT_URL = "https://www.atptour.com/en/scores/archive/australian-open/580/2025/results"
+
+
+def snapshot_store(root):
+    store = SnapshotStore(str(root))
+    results_html = read_fixture("results.html")
+    store.put(RESULT_URL, results_html)
+    for descriptor in parse_results_html(results_html, RESULT_URL):
+        store.put(descriptor["stats_url"], read_fixture("stats.html"))
+    return store
+
+
+def row_counts():
+    with Session(get_engine("scraper")) as session:
+        return tuple(session.exec(select(func.count()).select_from(model)).one() for model in (Match, Stats))
+
+
+def test_reingest_skips_stored_matches(sqlite_db, tmp_path):
+    store = snapshot_store(tmp_path)
+    tournament_id = get_or_create_tournament("Australian Open", "Melbourne, Australia", 2025)
+
+    _, match_ids = reingest_tournament(store, RESULT_URL, tournament_id)
+    assert len(match_ids) == 2
+    assert reingest_tournament(store, RESULT_URL, tournament_id) == (tournament_id, [])
+
+    assert row_counts() == (2, 4)
+    with Session(get_engine("scraper")) as session:
+        assert sorted(session.exec(select(ScrapeCheckpoint.match_id)).all()) == sorted(match_ids)
+
+
+def test_concurrent_puts_of_the_same_page(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    page = read_fixture("stats.html")
+    errors = []
+
+    def put():
+        # Every thread rewrites the same URL reference
+        try:
+            for _ in range(200):
+                store.put("https://example.test/stats/1", page)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.get("https://example.test/stats/1") == page
+    assert not list(tmp_path.rglob("*.tmp"))
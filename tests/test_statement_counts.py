@@ -0,0 +1,26 @@
+import pytest
+from conftest import QUERY_CASES, SYNTHETIC_SIZES, clear_caches, query_functions, use_database
+import utils
+from bench.run import pick_arguments
+from db import count_statements
+
+
+def count_for(url, name):
+    with use_database(url):
+        args = QUERY_CASES[name](*pick_arguments())
+        clear_caches()
+        with count_statements() as counter:
+            getattr(utils, name)(*args)
+    return counter["count"]
+
+
+def test_every_query_function_is_covered():
+    assert set(query_functions()) == set(QUERY_CASES)
+
+
+@pytest.mark.parametrize("name", sorted(QUERY_CASES))
+def test_statement_count_does_not_grow_with_data(synthetic_databases, name):
+    counts = {size: count_for(synthetic_databases[size], name) for size in SYNTHETIC_SIZES}
+    assert counts["small"] >= 1
+    # An N+1 pattern issues more statements on the larger database
+    assert counts["large"] == counts["small"], counts
@@ -1,94 +1,265 @@
+import numpy as np
 import pandas as pd
-from sqlmodel import Session, select
-from db import engine, Tournament, Match, Player, Stats
+from sqlalchemy import Float, Integer, case, func, type_coerce
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select, or_
+from db import (get_engine, Tournament, Match, Player, Stats, ROUND_ORDER,
+                PlayerStatAggregate, PlayerTournamentStatAggregate)
+from cache import cached
+from sketch import sketch_quantile
 
+@cached()
 def list_tournaments():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         tournaments = session.exec(select(Tournament)).all()
         return [(t.id, f"{t.name} ({t.city}, {t.year})") for t in tournaments]
 
 
+@cached()
 def list_players():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         players = session.exec(select(Player)).all()
         return [(t.id, t.name) for t in players]
 
 
+def _contains(column, query: str):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.ilike(f"%{escaped}%", escape="\\")
+
+
+@cached()
+def search_players(query: str = "", limit: int = 50):
+    with Session(get_engine()) as session:
+        stmt = select(Player.id, Player.name)
+        if query:
+            stmt = stmt.where(_contains(Player.name, query))
+        players = session.exec(stmt.order_by(Player.name).limit(limit)).all()
+        return [(player_id, name) for player_id, name in players]
+
+
+@cached()
+def search_tournaments(query: str = "", limit: int = 50):
+    with Session(get_engine()) as session:
+        stmt = select(Tournament)
+        if query:
+            stmt = stmt.where(_contains(Tournament.name, query))
+        stmt = stmt.order_by(Tournament.year.desc(), Tournament.name).limit(limit)
+        tournaments = session.exec(stmt).all()
+        return [(t.id, f"{t.name} ({t.city}, {t.year})") for t in tournaments]
+
+
+@cached()
 def list_matches_for_tournament(tournament_id: int):
-    with Session(engine) as session:
+    player1 = aliased(Player)
+    player2 = aliased(Player)
+    with Session(get_engine()) as session:
         matches = session.exec(
-            select(Match).where(Match.tournament_id == tournament_id)
+            select(Match.id, player1.name, player2.name)
+            .join(player1, player1.id == Match.player1_id)
+            .join(player2, player2.id == Match.player2_id)
+            .where(Match.tournament_id == tournament_id)
         ).all()
-        result = []
-        for match in matches:
-            p1 = session.get(Player, match.player1_id)
-            p2 = session.get(Player, match.player2_id)
-            result.append((match.id, f"{p1.name} vs {p2.name}"))
-        return result
+        return [(match_id, f"{p1_name} vs {p2_name}") for match_id, p1_name, p2_name in matches]
 
 
-def get_match_stats(match_id: int):
-    with Session(engine) as session:
-        stats = session.exec(select(Stats).where(Stats.match_id == match_id)).all()
-        rows = []
-        for s in stats:
-            player = session.get(Player, s.player_id)
-            data = s.dict()
-            data['player'] = player.name
-            rows.append(data)
-        # return pd.DataFrame(rows).drop(columns=["id", "match_id", "player_id"])
-        return pd.DataFrame(rows)
+# Stats columns in model order; the loader below types its arrays from each column's SQL type
+STATS_COLUMNS = list(Stats.__table__.columns)
+_DTYPES = {int: np.int64, float: np.float64}
 
-def get_player_stats_across_matches(player_id: int, tournament_id: int):
-    with Session(engine) as session:
-        player = session.get(Player, player_id)
 
-        matches = session.exec(
-            select(Match).where(
-                (Match.tournament_id == tournament_id) &
-                ((Match.player1_id == player_id) | (Match.player2_id == player_id))
-            )
-        ).all()
+def _dtype(column):
+    try:
+        return _DTYPES.get(column.type.python_type, object)
+    except NotImplementedError:
+        # Expressions without a declared type
+        return object
 
-        rows = []
-        for match in matches:
-            stats = session.exec(
-                select(Stats).where(
-                    (Stats.match_id == match.id) & (Stats.player_id == player_id)
-                )
-            ).first()
-            if stats:
-                row = stats.dict()
-                row["match_id"] = match.id
-                row["player"] = player.name
-                rows.append(row)
 
-        # Sort by match_id descending (lower = later match)
-        df = pd.DataFrame(rows).sort_values(by="match_id", ascending=False)
-        return df
+def _column_arrays(rows, dtypes):
+    # One array per column, sized up front; strings stay Python objects
+    columns = list(zip(*rows)) if rows else [()] * len(dtypes)
+    return [
+        np.fromiter(values, dtype=dtype, count=len(rows)) if dtype is not object else np.array(values, dtype=object)
+        for values, dtype in zip(columns, dtypes)
+    ]
 
 
-def get_players_in_tournament(tournament_id: int):
-    with Session(engine) as session:
-        matches = session.exec(
-            select(Match).where(Match.tournament_id == tournament_id)
-        ).all()
+def load_frame(stmt, stream: bool = False, chunk_size: int = 10_000) -> pd.DataFrame:
+    """Runs a Core select straight into typed NumPy columns and builds the DataFrame once.
+
+    With stream=True rows are fetched through a server-side cursor in chunks of chunk_size.
+    """
+    dtypes = [_dtype(column) for column in stmt.selected_columns]
+    with get_engine().connect() as conn:
+        if stream:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(stmt)
+            parts = [_column_arrays(chunk, dtypes) for chunk in result.partitions(chunk_size)]
+        else:
+            result = conn.execute(stmt)
+            parts = [_column_arrays(result.all(), dtypes)]
+        names = list(result.keys())
+
+    if len(parts) == 1:
+        arrays = parts[0]
+    elif parts:
+        arrays = [np.concatenate(columns) for columns in zip(*parts)]
+    else:
+        arrays = _column_arrays([], dtypes)
+    return pd.DataFrame(dict(zip(names, arrays)), copy=False)
+
+
+@cached()
+def get_match_stats(match_id: int):
+    return load_frame(
+        select(*STATS_COLUMNS, Player.name.label("player"))
+        .join(Player, Player.id == Stats.player_id)
+        .where(Stats.match_id == match_id)
+    )
+
+
+def chronological(descending: bool = False):
+    # Season, then date, then round; match id only breaks ties between undated matches of a round.
+    # Requires Match and Tournament in the FROM clause.
+    round_rank = case(ROUND_ORDER, value=Match.round, else_=0)
+    if descending:
+        return [Tournament.year.desc(), Match.played_on.desc().nulls_last(), round_rank.desc(), Match.id.desc()]
+    return [Tournament.year, Match.played_on.asc().nulls_first(), round_rank, Match.id]
 
-        player_ids = set()
-        for match in matches:
-            player_ids.add(match.player1_id)
-            player_ids.add(match.player2_id)
 
+@cached()
+def get_player_stats_across_matches(player_id: int, tournament_id: int):
+    # Latest match first, with the round and date that order it
+    return load_frame(
+        select(*STATS_COLUMNS, Player.name.label("player"), Match.round, Match.played_on)
+        .join(Match, Match.id == Stats.match_id)
+        .join(Player, Player.id == Stats.player_id)
+        .join(Tournament, Tournament.id == Match.tournament_id)
+        .where(
+            (Match.tournament_id == tournament_id) &
+            (Stats.player_id == player_id)
+        )
+        .order_by(*chronological(descending=True))
+    )
+
+
+@cached()
+def get_players_in_tournament(tournament_id: int):
+    with Session(get_engine()) as session:
         players = session.exec(
-            select(Player).where(Player.id.in_(player_ids))
+            select(Player.id, Player.name)
+            .join(Match, or_(Match.player1_id == Player.id, Match.player2_id == Player.id))
+            .where(Match.tournament_id == tournament_id)
+            .distinct()
         ).all()
 
-        return [(player.id, player.name) for player in players]
+        return [(player_id, name) for player_id, name in players]
 
 
+@cached()
 def get_player_stat_values(player_id: int, stat: str) -> list[float]:
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         stmt = select(getattr(Stats, stat)).where(Stats.player_id == player_id)
         results = session.exec(stmt).all()
 
-    return [r for r in results if r is not None]
\ No newline at end of file
+    return [r for r in results if r is not None]
+
+
+@cached()
+def get_player_name(player_id: int) -> str:
+    with Session(get_engine()) as session:
+        player = session.get(Player, player_id)
+        return player.name if player else f"Player #{player_id}"
+
+
+@cached()
+def get_tournament_name(tournament_id: int) -> str:
+    with Session(get_engine()) as session:
+        tournament = session.get(Tournament, tournament_id)
+        return tournament.name if tournament else f"Tournament #{tournament_id}"
+
+
+@cached(ttl=60)
+def get_player_stat_matrix(player_id: int, stats: list[str]) -> dict[str, np.ndarray]:
+    # All requested columns from one ordered scan, so values at the same index belong to the same match
+    columns = [getattr(Stats, stat) for stat in stats]
+    with Session(get_engine()) as session:
+        rows = session.exec(
+            select(*columns)
+            .where(Stats.player_id == player_id)
+            .order_by(Stats.match_id)
+        ).all()
+
+    rows = [row for row in rows if None not in tuple(row)]
+    values = np.array(rows, dtype=float).reshape(len(rows), len(stats))
+    return {stat: values[:, i] for i, stat in enumerate(stats)}
+
+
+@cached()
+def get_tournament_label(tournament_id: int) -> str:
+    with Session(get_engine()) as session:
+        t = session.get(Tournament, tournament_id)
+        return f"{t.name} ({t.city}, {t.year})" if t else f"Tournament #{tournament_id}"
+
+
+@cached()
+def get_player_stat_summary(player_id: int, stat: str, tournament_id: int | None = None):
+    # Single-row lookup in the aggregate tables maintained by db.update_aggregates
+    with Session(get_engine()) as session:
+        if tournament_id is None:
+            aggregate = session.get(PlayerStatAggregate, (player_id, stat))
+        else:
+            aggregate = session.get(PlayerTournamentStatAggregate, (player_id, tournament_id, stat))
+
+    if aggregate is None or not aggregate.count:
+        return None
+    mean = aggregate.total / aggregate.count
+    variance = max(aggregate.total_sq / aggregate.count - mean * mean, 0.0)
+    return {
+        "count": aggregate.count,
+        "mean": mean,
+        "std": variance ** 0.5,
+        "min": aggregate.min_value,
+        "max": aggregate.max_value,
+        "q25": sketch_quantile(aggregate.sketch, 0.25),
+        "median": sketch_quantile(aggregate.sketch, 0.5),
+        "q75": sketch_quantile(aggregate.sketch, 0.75),
+    }
+
+
+@cached()
+def get_player_form(player_id: int, stat: str, window: int = 5, alpha: float = 0.3):
+    """One row per match of the player in chronological order, with form indicators for `stat`.
+
+    rolling_mean (last `window` matches) and streak (current run of wins > 0 or losses < 0)
+    come from window functions in the database; ewma is exponentially weighted with `alpha`.
+    """
+    value = getattr(Stats, stat)
+    won = case((Match.winner_id == player_id, 1), else_=0)
+    order = chronological()
+    ordered = (
+        select(
+            Stats.match_id, Tournament.name.label("tournament"), Tournament.year, Match.round, Match.played_on,
+            value.label("value"),
+            type_coerce(won, Integer).label("won"),
+            func.row_number().over(order_by=order).label("n"),
+            type_coerce(func.avg(value).over(order_by=order, rows=(-(window - 1), 0)), Float).label("rolling_mean"),
+            # Gaps and islands: constant within each run of consecutive wins or losses
+            (func.row_number().over(order_by=order) - func.row_number().over(partition_by=won, order_by=order))
+            .label("run"),
+        )
+        .join(Match, Match.id == Stats.match_id)
+        .join(Tournament, Tournament.id == Match.tournament_id)
+        .where(Stats.player_id == player_id)
+        .subquery()
+    )
+    run_length = func.count().over(partition_by=(ordered.c.won, ordered.c.run), order_by=ordered.c.n)
+    df = load_frame(
+        select(
+            ordered.c.match_id, ordered.c.tournament, ordered.c.year, ordered.c.round, ordered.c.played_on,
+            ordered.c.value, ordered.c.won, ordered.c.rolling_mean,
+            type_coerce(case((ordered.c.won == 1, run_length), else_=-run_length), Integer).label("streak"),
+        )
+        .order_by(ordered.c.n)
+    )
+    df["ewma"] = df["value"].astype(float).ewm(alpha=alpha).mean()
+    return df